@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+
+def create_async_client(api_key=None, base_url=None, max_connections=20, timeout=60.0, max_retries=2):
+    """
+    Create one AsyncGroq client whose HTTP connections are pooled and reused by every request.
+
+    Pass ``max_retries=0`` when a ``RequestScheduler`` does the retrying.
+    """
+    import groq
+    import httpx
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        timeout=timeout
+    )
+    return groq.AsyncGroq(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=max_retries)
+
+
+class AsyncRunner:
+    """
+    Runs an asyncio event loop on a background thread.
+
+    The GUI submits coroutines with ``submit`` and hears back through Qt signals, which
+    Qt queues onto the GUI thread, so the two event loops never block each other.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run, name="asyncio-loop", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def close(self, client=None, timeout=5.0):
+        if client is not None:
+            try:
+                self.submit(client.close()).result(timeout=timeout)
+            except Exception:
+                pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=timeout)
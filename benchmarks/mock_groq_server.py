@@ -0,0 +1,143 @@
+"""
+Local stand-in for the Groq chat-completions endpoint, for benchmarks.
+
+    python benchmarks/mock_groq_server.py --port 8765 --latency 0.2 --tokens-per-sec 250
+
+Point a client at it with ``base_url="http://127.0.0.1:8765"``. Both plain and
+streamed (server-sent events) completions are supported, with a configurable delay
+before the first token and a fixed token rate after it. A share of requests can be
+answered with 429 rate-limit errors to exercise retries, and individual models can be
+given their own delay to exercise routing and racing.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ["the", "model", "returns", "a", "streamed", "answer", "with", "some", "code", "and", "text"]
+
+
+def synthetic_tokens(count: int) -> list:
+    return [(" " if i else "") + WORDS[i % len(WORDS)] for i in range(count)]
+
+
+class MockGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client cancelled or hedged the request
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        config = self.server.config
+        if random.random() < config["error_rate"]:
+            self.send_rate_limited()
+            return
+        tokens = synthetic_tokens(config["reply_tokens"])
+        usage = {"prompt_tokens": sum(len(m.get("content", "")) // 4 for m in body.get("messages", [])),
+                 "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        time.sleep(config["model_latency"].get(body.get("model"), config["latency"]))
+        if body.get("stream"):
+            self.stream_reply(body.get("model", "mock"), tokens, usage, config["tokens_per_sec"])
+        else:
+            time.sleep(len(tokens) / config["tokens_per_sec"])
+            payload = json.dumps({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get("model", "mock"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}],
+                "usage": usage
+            }).encode("utf-8")
+            self.send_response(200)
+            self.send_rate_limit_headers()
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    def send_rate_limited(self):
+        payload = json.dumps({"error": {"message": "Rate limit reached", "type": "tokens",
+                                        "code": "rate_limit_exceeded"}}).encode("utf-8")
+        self.send_response(429)
+        self.send_header("retry-after", "0.05")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def send_rate_limit_headers(self):
+        self.send_header("x-ratelimit-limit-requests", "14400")
+        self.send_header("x-ratelimit-remaining-requests", "14399")
+        self.send_header("x-ratelimit-reset-requests", "6s")
+        self.send_header("x-ratelimit-limit-tokens", "30000")
+        self.send_header("x-ratelimit-remaining-tokens", "29000")
+        self.send_header("x-ratelimit-reset-tokens", "2s")
+
+    def stream_reply(self, model, tokens, usage, tokens_per_sec):
+        self.send_response(200)
+        self.send_rate_limit_headers()
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for token in tokens:
+            self.send_event({**base, "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+            time.sleep(1 / tokens_per_sec)
+        self.send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                         "x_groq": {"id": "req-mock", "usage": usage}})
+        self.send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_event(self, data):
+        text = data if isinstance(data, str) else json.dumps(data)
+        payload = f"data: {text}\n\n".encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+        self.wfile.flush()
+
+
+def start_mock_server(host="127.0.0.1", port=0, latency=0.05, tokens_per_sec=500.0, reply_tokens=200,
+                      error_rate=0.0, model_latency=None):
+    """Start the server on a daemon thread and return ``(server, base_url)``; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), MockGroqHandler)
+    server.daemon_threads = True
+    server.config = {"latency": latency, "tokens_per_sec": tokens_per_sec, "reply_tokens": reply_tokens,
+                     "error_rate": error_rate, "model_latency": dict(model_latency or {})}
+    threading.Thread(target=server.serve_forever, name="mock-groq", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Groq chat-completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--reply-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 429")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="first-token delay for one model; repeatable")
+    args = parser.parse_args()
+    model_latency = {model: float(seconds) for model, _, seconds in (item.partition("=") for item in args.model_latency)}
+    server, url = start_mock_server(
+        args.host, args.port, args.latency, args.tokens_per_sec, args.reply_tokens, args.error_rate, model_latency)
+    print(f"Mock Groq API listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Benchmarks for the app's hot paths, run against a local mock of the Groq API.
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --quick --only render,history --compare bench.json
+
+Groups:
+  requests  end-to-end latency and time-to-first-token through AIChatApp.get_ai_response
+  render    format_markdown, incremental markdown while streaming, format_code_snippet, display_message
+  history   Markdown/PDF export, session store writes and search over a large history
+
+Results (ms per call: mean, p50, p95, min, max) are written as JSON so runs can be compared.
+The GUI is created with the offscreen Qt platform unless QT_QPA_PLATFORM is already set.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from threading import Event
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from mock_groq_server import start_mock_server  # noqa: E402
+
+PROSE = (
+    "The scheduler keeps a rolling window of request timings per model and uses it to decide "
+    "when a request should be retried or hedged. "
+)
+
+
+def summarize(samples: list) -> dict:
+    ordered = sorted(samples)
+    ms = [value * 1000 for value in ordered]
+    return {
+        "n": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(ms[len(ms) // 2], 3),
+        "p95_ms": round(ms[min(int(len(ms) * 0.95), len(ms) - 1)], 3),
+        "min_ms": round(ms[0], 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def time_calls(fn, iterations: int, setup=None) -> list:
+    samples = []
+    for _ in range(iterations):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def synthetic_reply(kind: str, size: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    if kind == "long":
+        parts = []
+        for i in range(size):
+            parts.append(PROSE * rng.randint(2, 5))
+            parts.append("\n".join(f"{n}. step {n} of the plan" for n in range(10, 14)))
+        return "\n\n".join(parts)
+    blocks = []
+    for i in range(size):
+        language = ["python", "javascript", "cpp", ""][i % 4]
+        body = "\n".join(f"def handler_{i}_{n}(value):\n    return value * {n}  # seed {seed}" for n in range(30))
+        blocks.append(f"Block {i} explanation.\n```{language}\n{body}\n```")
+    return "\n\n".join(blocks)
+
+
+def bench_requests(app, args, results):
+    import groq_ai
+    from async_client import create_async_client
+
+    server, url = start_mock_server(latency=args.latency, tokens_per_sec=args.tokens_per_sec,
+                                    reply_tokens=args.reply_tokens)
+    groq_ai.client = create_async_client(api_key="benchmark", base_url=url, max_retries=0)
+    messages = [{"role": "user", "content": "Explain the benchmark."}]
+    try:
+        for stream in (False, True):
+            latencies, first_tokens = [], []
+            for _ in range(args.requests):
+                first = []
+                started = time.perf_counter()
+
+                def on_chunk(delta, first=first):
+                    if not first:
+                        first.append(time.perf_counter())
+
+                app.runner.submit(app.get_ai_response(
+                    "llama3-8b-8192", messages, stream=stream, on_chunk=on_chunk)).result()
+                finished = time.perf_counter()
+                latencies.append(finished - started)
+                first_tokens.append((first[0] if first else finished) - started)
+            mode = "stream" if stream else "plain"
+            results[f"request.{mode}.latency"] = summarize(latencies)
+            results[f"request.{mode}.time_to_first_token"] = summarize(first_tokens)
+    finally:
+        server.shutdown()
+
+
+def stream_markdown(text: str, delta_size: int = 40):
+    """Render a reply the way a stream arrives: in small deltas, each returning only finished blocks."""
+    from markdown_render import MarkdownRenderer
+
+    renderer = MarkdownRenderer()
+    for start in range(0, len(text), delta_size):
+        renderer.feed(text[start:start + delta_size])
+    return renderer.finish()
+
+
+def bench_render(app, args, results):
+    from PyQt6.QtWidgets import QApplication
+    from highlighting import clear_highlight_cache, highlight_code
+
+    for kind, size in (("long", args.reply_size), ("code", max(args.reply_size // 4, 1))):
+        text = synthetic_reply(kind, size)
+        record = app.create_record(app.conversation, "AI Assistant", text, app.ai_label_color, app.ai_chat_color)
+        results[f"render.format_markdown.{kind}"] = summarize(time_calls(
+            lambda: app.format_markdown(text, record.code_ids), args.iterations, clear_highlight_cache))
+        results[f"render.markdown_stream.{kind}"] = summarize(
+            time_calls(lambda: stream_markdown(text), args.iterations))
+
+        def display():
+            app.display_message("AI Assistant", text, app.ai_label_color, app.ai_chat_color)
+            QApplication.processEvents()
+
+        results[f"render.display_message.{kind}"] = summarize(time_calls(display, args.iterations))
+
+    code = synthetic_reply("code", 1).split("```python\n", 1)[1].rsplit("```", 1)[0]
+    # Cold highlighting runs on the thread pool, so it is timed directly: lexer lookup or guessing.
+    app.threadpool.waitForDone()
+    results["render.highlight_code.tagged_cold"] = summarize(
+        time_calls(lambda: highlight_code(code, "python"), args.iterations, clear_highlight_cache))
+    results["render.highlight_code.untagged_cold"] = summarize(
+        time_calls(lambda: highlight_code(code), args.iterations, clear_highlight_cache))
+    results["render.format_code_snippet.cold"] = summarize(
+        time_calls(lambda: app.format_code_snippet(code, 1, "python"), args.iterations, clear_highlight_cache))
+    app.threadpool.waitForDone()
+    QApplication.processEvents()
+    results["render.format_code_snippet.tagged_warm"] = summarize(
+        time_calls(lambda: app.format_code_snippet(code, 1, "python"), args.iterations))
+    app.conversation.reset()
+
+
+def bench_history(app, args, results):
+    from exporters import export_markdown, export_pdf, run_export
+    from search_index import TokenIndex, parse_search_query
+    from session_store import SessionStore
+
+    rng = random.Random(1)
+    history = [
+        {"role": "user" if i % 2 == 0 else "assistant",
+         "content": synthetic_reply("long", 1, seed=i) if i % 7 else synthetic_reply("code", 1, seed=i)}
+        for i in range(args.history)
+    ]
+    conv = app.conversation
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            conv.chat_history[:] = history
+            results["history.export_markdown"] = summarize(time_calls(
+                lambda: run_export(export_markdown(app.export_messages(conv)[0], "chat_history.md"), Event()), 3))
+            conv.chat_history[:] = history[:args.history // 10]
+            results["history.export_pdf"] = summarize(time_calls(
+                lambda: run_export(export_pdf(app.export_messages(conv)[0], "chat_history.pdf"), Event()), 1))
+
+            store = SessionStore(os.path.join(tmp, "bench.sqlite3"), flush_interval=0.05)
+            session_id = store.create_session("benchmark", "llama3-8b-8192")
+
+            def write_all():
+                for message in history:
+                    store.append(session_id, message["role"], message["content"])
+                store.flush()
+
+            results["history.store_append_and_flush"] = summarize(time_calls(write_all, 1))
+            queries = ["rolling window", '"step 11"', "role:user scheduler hedged", "handler_3_7"]
+            samples = []
+            for _ in range(args.iterations):
+                query = rng.choice(queries)
+                started = time.perf_counter()
+                store.search(*parse_search_query(query))
+                samples.append(time.perf_counter() - started)
+            results["history.store_search"] = summarize(samples)
+            store.close()
+
+            index = TokenIndex()
+            started = time.perf_counter()
+            for key, message in enumerate(history):
+                index.add(key, message["role"], message["content"])
+            results["history.token_index_build"] = summarize([time.perf_counter() - started])
+            results["history.token_index_search"] = summarize(
+                time_calls(lambda: index.search(*parse_search_query(rng.choice(queries))), args.iterations))
+        finally:
+            conv.chat_history.clear()
+            os.chdir(cwd)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(results: dict, baseline: dict = None):
+    width = max(len(name) for name in results)
+    for name, summary in results.items():
+        line = f"{name:<{width}}  p50 {summary['p50_ms']:>10.3f} ms  p95 {summary['p95_ms']:>10.3f} ms  n={summary['n']}"
+        if baseline and name in baseline:
+            before = baseline[name]["p50_ms"]
+            if before:
+                line += f"  ({(summary['p50_ms'] - before) / before * 100:+.1f}% vs baseline)"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the chat app's hot paths.")
+    parser.add_argument("--only", default="requests,render,history", help="comma-separated groups to run")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="JSON results from an earlier run to compare against")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations and a smaller history")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--history", type=int, default=5000, help="messages in the synthetic history")
+    parser.add_argument("--reply-size", type=int, default=40, help="paragraphs in a synthetic long reply")
+    parser.add_argument("--latency", type=float, default=0.05, help="mock server delay before the first token")
+    parser.add_argument("--tokens-per-sec", type=float, default=500.0)
+    parser.add_argument("--reply-tokens", type=int, default=200)
+    args = parser.parse_args(argv)
+    if args.quick:
+        args.iterations, args.requests, args.history, args.reply_size = 5, 3, 500, 10
+
+    from PyQt6.QtWidgets import QApplication
+    qt_app = QApplication.instance() or QApplication(sys.argv[:1])
+    import groq_ai
+
+    groups = {"requests": bench_requests, "render": bench_render, "history": bench_history}
+    results = {}
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # The app keeps its response cache, snippets and sessions in the working directory;
+        # run it somewhere disposable so benchmark data never lands in the user's stores.
+        os.chdir(workdir)
+        try:
+            app = groq_ai.AIChatApp()
+            app.save_log = False
+            app.use_cache = False
+            try:
+                for group in args.only.split(","):
+                    groups[group.strip()](app, args, results)
+            finally:
+                app.threadpool.waitForDone()
+                app.close()
+                qt_app.processEvents()
+        finally:
+            os.chdir(cwd)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+    print_results(results, baseline)
+    if args.output:
+        report = {
+            "meta": {
+                "revision": git_revision(),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "args": vars(args),
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
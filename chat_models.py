@@ -0,0 +1,27 @@
+MODEL_MAPPING = {
+    "🤖 Llama3 8B": "llama3-8b-8192",
+    "🧠 Mixtral 8x7B": "mixtral-8x7b-32768",
+    "🚀 Llama3 70B": "llama3-70b-8192",
+    "🛡️ Llama Guard 3 8B": "llama-guard-3-8b",
+    "🔐 Gemma 2 9B": "gemma2-9b-it",
+    "💀 Llama 3.3 70B SpecDec": "llama-3.3-70b-specdec",
+    "🕵️ Llama 3.2 11B Vision Preview": "llama-3.2-11b-vision-preview",
+    "⚡ DeepSeek-R1": "deepseek-r1-distill-llama-70b"
+}
+
+MODEL_CONTEXT_SIZES = {
+    "llama3-8b-8192": 8192,
+    "mixtral-8x7b-32768": 32768,
+    "llama3-70b-8192": 8192,
+    "llama-guard-3-8b": 8192,
+    "gemma2-9b-it": 8192,
+    "llama-3.3-70b-specdec": 8192,
+    "llama-3.2-11b-vision-preview": 8192,
+    "deepseek-r1-distill-llama-70b": 131072
+}
+
+DEFAULT_CONTEXT_SIZE = 8192
+
+
+def context_size(model: str) -> int:
+    return MODEL_CONTEXT_SIZES.get(model, DEFAULT_CONTEXT_SIZE)
@@ -0,0 +1,93 @@
+import re
+
+from chat_models import context_size
+
+MESSAGE_OVERHEAD_TOKENS = 4
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) that never calls a tokenizer."""
+    return len(text) // 4 + MESSAGE_OVERHEAD_TOKENS
+
+
+def extractive_summary(previous: str, messages: list, max_chars: int) -> str:
+    """Fold messages into a rolling summary by keeping the first sentence of each turn."""
+    lines = [previous] if previous else []
+    for msg in messages:
+        first = re.split(r"(?<=[.!?])\s+", msg["content"].strip(), maxsplit=1)[0]
+        lines.append(f"{msg['role'].capitalize()}: {first[:200]}")
+    summary = "\n".join(lines)
+    if len(summary) > max_chars:
+        summary = summary[-max_chars:]
+        summary = summary[summary.find("\n") + 1:] or summary
+    return summary
+
+
+class ContextWindow:
+    """
+    Builds the message list sent to the API so it fits the model's context size.
+
+    Token counts are cached per message and only new messages are counted on each
+    call, so preparing a request does not rescan the whole history. The system prompt
+    is always pinned, the newest turns are kept, and turns that fall out of the window
+    can optionally be folded into a rolling summary.
+    """
+
+    def __init__(self, reserve_for_reply: int = 1024, summary_tokens: int = 512, summarizer=None):
+        self.reserve_for_reply = reserve_for_reply
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer or extractive_summary
+        self.summarize = False
+        self.budgets = {}
+        self.token_counts = []
+        self.total_tokens = 0
+        self.summary = ""
+        self.summarized_upto = 0
+
+    def reset(self):
+        self.token_counts.clear()
+        self.total_tokens = 0
+        self.summary = ""
+        self.summarized_upto = 0
+
+    def budget_for(self, model: str) -> int:
+        if model in self.budgets:
+            return self.budgets[model]
+        return max(context_size(model) - self.reserve_for_reply, 256)
+
+    def set_budget(self, model: str, budget: int):
+        self.budgets[model] = budget
+
+    def sync(self, history: list):
+        if len(history) < len(self.token_counts):
+            self.reset()
+        for msg in history[len(self.token_counts):]:
+            count = estimate_tokens(msg["content"])
+            self.token_counts.append(count)
+            self.total_tokens += count
+
+    def build(self, history: list, model: str, system_prompt: str = "") -> list:
+        self.sync(history)
+        budget = self.budget_for(model)
+        pinned = []
+        if system_prompt:
+            pinned.append({"role": "system", "content": system_prompt})
+            budget -= estimate_tokens(system_prompt)
+        if self.summarize:
+            budget -= self.summary_tokens
+
+        start = len(history)
+        used = 0
+        while start > 0 and (used + self.token_counts[start - 1] <= budget or start == len(history)):
+            start -= 1
+            used += self.token_counts[start]
+
+        if self.summarize and start > 0:
+            if start > self.summarized_upto:
+                self.summary = self.summarizer(
+                    self.summary, history[self.summarized_upto:start], self.summary_tokens * 4)
+                self.summarized_upto = start
+            if self.summary:
+                pinned.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+        return pinned + [{"role": msg["role"], "content": msg["content"]} for msg in history[start:]]
@@ -0,0 +1,105 @@
+"""
+Streaming exporters for chat history and code snippets.
+
+Each export is a generator that writes one item at a time and yields how many items it
+has written so far, so the caller can report progress and stop between items. Output
+goes to ``<path>.part`` and is renamed into place only once complete, so a cancelled or
+failed export never leaves a half-written file behind.
+
+Messages are any iterable of dicts with ``role`` and ``content``, such as a chat history
+list or ``SessionStore.iter_messages``, which lets archived sessions be exported without
+loading them into the window.
+"""
+import os
+import time
+
+from highlighting import extract_code_snippets
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _write_text(path, items, render):
+    temp = path + ".part"
+    try:
+        with open(temp, "w", encoding="utf-8") as file:
+            for count, item in enumerate(items, 1):
+                file.write(render(item))
+                yield count
+        os.replace(temp, path)
+    except BaseException:
+        _discard(temp)
+        raise
+
+
+def render_markdown(message) -> str:
+    return f"**{message['role'].capitalize()}:**\n\n{message['content']}\n\n---\n\n"
+
+
+def render_snippet(snippet) -> str:
+    label, language, code = snippet
+    header = f"--- Snippet {label} ({language}) ---" if language else f"--- Snippet {label} ---"
+    return f"{header}\n{code.rstrip()}\n\n"
+
+
+def export_markdown(messages, path):
+    return _write_text(path, messages, render_markdown)
+
+
+def export_snippets(snippets, path):
+    """Write ``(label, language, code)`` tuples to a text file."""
+    return _write_text(path, snippets, render_snippet)
+
+
+def snippets_in(messages):
+    """Yield ``(label, language, code)`` for every fenced code block in the AI's messages."""
+    count = 0
+    for message in messages:
+        if message["role"] != "assistant":
+            continue
+        for language, code in extract_code_snippets(message["content"]):
+            count += 1
+            yield count, language, code
+
+
+def _latin1(text: str) -> str:
+    # FPDF's built-in fonts only cover Latin-1.
+    return text.encode("latin-1", "replace").decode("latin-1")
+
+
+def export_pdf(messages, path):
+    from fpdf import FPDF
+
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    count = 0
+    for count, message in enumerate(messages, 1):
+        pdf.multi_cell(0, 10, _latin1(f"{message['role'].capitalize()}: {message['content']}"))
+        pdf.ln()
+        yield count
+    temp = path + ".part"
+    try:
+        pdf.output(temp)
+        os.replace(temp, path)
+    except BaseException:
+        _discard(temp)
+        raise
+
+
+def run_export(job, cancel, progress=None, interval: float = 0.05) -> int:
+    """Drive an export generator until it finishes or ``cancel`` is set. Returns items written, or -1 if cancelled."""
+    count = 0
+    reported = time.monotonic()
+    for count in job:
+        if cancel.is_set():
+            job.close()
+            return -1
+        if progress is not None and time.monotonic() - reported >= interval:
+            progress(count)
+            reported = time.monotonic()
+    return count
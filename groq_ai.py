@@ -1,33 +1,91 @@
-import re
+import time
+
+STARTUP_STARTED = time.perf_counter()
+
 import os
 import sys
 import html
+import importlib
+import itertools
+import threading
+from collections import OrderedDict
 
 from PyQt6.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QTextBrowser, QLineEdit, QPushButton, QMenu,
-    QLabel, QComboBox, QHBoxLayout, QColorDialog, QMessageBox, QFontDialog, QInputDialog, QTextEdit
+    QApplication, QWidget, QVBoxLayout, QLineEdit, QPushButton, QMenu, QListView, QAbstractItemView,
+    QStyledItemDelegate, QStyle, QLabel, QComboBox, QHBoxLayout, QColorDialog, QMessageBox, QFontDialog,
+    QInputDialog, QTextBrowser, QTabWidget, QFileDialog, QProgressDialog, QListWidget, QListWidgetItem
+)
+from PyQt6.QtGui import (
+    QAction, QColor, QFont, QFontMetrics, QPainter, QPen, QPolygonF, QTextBlockFormat, QTextCursor, QTextDocument
+)
+from PyQt6.QtCore import (
+    Qt, QUrl, QRunnable, QThreadPool, QTimer, pyqtSignal, QObject, QAbstractListModel, QModelIndex,
+    QSize, QPointF, QRectF
 )
-from PyQt6.QtGui import QAction, QTextCursor, QColor, QFont
-from PyQt6.QtCore import Qt, QUrl, QRunnable, QThreadPool, pyqtSignal, QObject
 
-import groq
-import pyttsx3
-from fpdf import FPDF
+from async_client import AsyncRunner, create_async_client
+from chat_models import MODEL_MAPPING, context_size
+from context_window import ContextWindow, estimate_tokens
+from markdown_render import MarkdownRenderer
+from exporters import export_markdown, export_pdf, export_snippets, run_export, snippets_in
+from request_scheduler import RequestScheduler
+from response_cache import ResponseCache, make_key
+from routing import AUTO, FASTEST, ROUTING_MODES, LatencyRouter, race
+from sentiment import SentimentScorer, label as sentiment_label
+from session_store import SessionStore
+from snippet_store import SnippetStore
+from speech import SpeechQueue
+from telemetry import Telemetry
+from search_index import TokenIndex, highlight_excerpt, parse_search_query
+from highlighting import (
+    cache_key, cached_highlight, can_highlight_inline, detect_language, extension_for, extract_code_snippets,
+    highlight_code, highlight_snippet, plain_code
+)
+
+API_KEY = "YOUR_KEY_HERE"  # Replace with your actual API key
+client = None
 
-from textblob import TextBlob
+# Heavy libraries that are only needed once a request, export, sentiment check or
+# speech action runs; they are imported in the background after the window is shown.
+WARM_UP_MODULES = ["groq", "httpx", "pygments.lexers", "pygments.formatters", "fpdf", "textblob", "pyttsx3"]
 
-from pygments import highlight
-from pygments.lexers import guess_lexer, PythonLexer
-from pygments.formatters import HtmlFormatter
 
-client = groq.Groq(
-    api_key="YOUR_KEY_HERE")  # Replace with your actual API key
+def get_client():
+    global client
+    if client is None:
+        client = create_async_client(api_key=API_KEY, max_retries=0)
+    return client
+
+
+def warm_up_modules() -> float:
+    started = time.perf_counter()
+    for name in WARM_UP_MODULES:
+        try:
+            importlib.import_module(name)
+        except Exception:
+            pass
+    return (time.perf_counter() - started) * 1000
+
+
+def print_startup_report(phases):
+    total = 0.0
+    print("Startup timing:", file=sys.stderr)
+    for name, seconds in phases:
+        total += seconds
+        print(f"  {name:<18} {seconds * 1000:8.1f} ms", file=sys.stderr)
+    print(f"  {'total':<18} {total * 1000:8.1f} ms", file=sys.stderr)
+
+SENDER_ROLES = {"You": "user", "AI Assistant": "assistant"}
+MESSAGE_SEPARATOR = "<br>━━━━━━━━━━━━✦━━━━━━━━━━━━<br>"
 
 
 class WorkerSignals(QObject):
     finished = pyqtSignal()
     error = pyqtSignal(Exception)
-    result = pyqtSignal(str)
+    result = pyqtSignal(object)
+    chunk = pyqtSignal(str)
+    usage = pyqtSignal(dict)
+    progress = pyqtSignal(int)
 
 
 class Worker(QRunnable):
@@ -42,15 +100,387 @@ class Worker(QRunnable):
         try:
             result = self.fn(*self.args, **self.kwargs)
         except Exception as e:
-            self.signals.error.emit(e)
+            signal, value = self.signals.error, e
         else:
-            self.signals.result.emit(result)
-        finally:
+            signal, value = self.signals.result, result
+        try:
+            signal.emit(value)
             self.signals.finished.emit()
+        except RuntimeError:
+            # The app shut down while this job was still running and its signals are gone.
+            pass
+
+
+class ChatMessage:
+    """
+    Compact record for one displayed message; rendered HTML is never stored here, apart from
+    the finished blocks of a reply that is still streaming, kept by its ``markdown`` renderer.
+    """
+    __slots__ = ("id", "sender", "role", "text", "label_color", "text_color", "code_ids", "streaming",
+                 "markdown", "message_id", "height", "height_width", "estimate", "estimate_width")
+    ids = itertools.count(1)
+
+    def __init__(self, sender, text, label_color, text_color, streaming=False):
+        self.id = next(ChatMessage.ids)
+        self.sender = sender
+        self.role = SENDER_ROLES.get(sender, "system")
+        self.text = text
+        self.label_color = label_color
+        self.text_color = text_color
+        self.code_ids = []
+        self.streaming = streaming
+        self.markdown = None
+        self.message_id = None
+        self.invalidate()
+
+    def invalidate(self):
+        self.height = None
+        self.height_width = None
+        self.estimate = None
+        self.estimate_width = None
+
+
+class ChatMessageModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.records = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        record = self.records[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return record.text
+        if role == Qt.ItemDataRole.UserRole:
+            return record
+        return None
+
+    def append(self, record):
+        row = len(self.records)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.records.append(record)
+        self.endInsertRows()
+
+    def prepend(self, records):
+        if not records:
+            return
+        self.beginInsertRows(QModelIndex(), 0, len(records) - 1)
+        self.records[0:0] = records
+        self.endInsertRows()
+
+    def row_of(self, record) -> int:
+        for row in range(len(self.records) - 1, -1, -1):
+            if self.records[row] is record:
+                return row
+        return -1
+
+    def remove(self, record):
+        row = self.row_of(record)
+        if row < 0:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.records[row]
+        self.endRemoveRows()
+
+    def record_changed(self, record):
+        record.invalidate()
+        row = self.row_of(record)
+        if row < 0:
+            return
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def clear(self):
+        self.beginResetModel()
+        self.records.clear()
+        self.endResetModel()
+
+    def relayout(self):
+        self.layoutAboutToBeChanged.emit()
+        for record in self.records:
+            record.invalidate()
+        self.layoutChanged.emit()
+
+
+class ChatMessageDelegate(QStyledItemDelegate):
+    """
+    Paints messages from a small LRU of QTextDocuments so only visible and nearby rows
+    hold rendered HTML. Rows that were never painted report an estimated height from
+    their raw text and are corrected once they scroll into view.
+
+    A streaming reply keeps its document: blocks its renderer has closed are appended once,
+    and only the tail after them (an open list or table plus the unrendered text) is replaced.
+    """
+
+    def __init__(self, render, frame, parent=None, max_documents=64):
+        super().__init__(parent)
+        self.render = render
+        self.frame = frame
+        self.max_documents = max_documents
+        self.documents = OrderedDict()
+        self.streams = {}
+        self.font = QFont()
+        self.font.setPixelSize(14)
+
+    def clear_cache(self):
+        self.documents.clear()
+        self.streams.clear()
+
+    def forget(self, record):
+        self.documents.pop(record.id, None)
+        self.streams.pop(record.id, None)
+
+    def extend_stream(self, record):
+        """Bring a streaming record's cached document up to date; returns False if it has none."""
+        doc = self.documents.get(record.id)
+        if doc is None:
+            return False
+        self._write_stream(record, doc)
+        return True
+
+    def _write_stream(self, record, doc):
+        label, span = self.frame(record)
+        markdown = record.markdown
+        cursor = QTextCursor(doc)
+        state = self.streams.get(record.id)
+        if state is None:
+            doc.setHtml(label)
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            # Characters of markdown.html already in the document, and where the replaceable tail starts.
+            state = self.streams[record.id] = [0, cursor.position()]
+        cursor.setPosition(state[1])
+        cursor.movePosition(QTextCursor.MoveOperation.End, QTextCursor.MoveMode.KeepAnchor)
+        cursor.removeSelectedText()
+        if markdown.closed > state[0]:
+            # insertHtml merges the first block into the current one, so start a fresh block.
+            cursor.insertBlock(QTextBlockFormat())
+            cursor.insertHtml(f"{span}{markdown.html[state[0]:markdown.closed]}</span>")
+            state[0] = markdown.closed
+            state[1] = cursor.position()
+        tail = markdown.html[markdown.closed:] + html.escape(markdown.pending()).replace("\n", "<br>")
+        if state[0]:
+            cursor.insertBlock(QTextBlockFormat())
+        else:
+            cursor.insertText(" ")
+        cursor.insertHtml(f"{span}{tail}</span>{MESSAGE_SEPARATOR}")
+
+    def document_for(self, record, width):
+        doc = self.documents.get(record.id)
+        if doc is None:
+            doc = QTextDocument()
+            doc.setDefaultFont(self.font)
+            doc.setDefaultStyleSheet("body { color: white; }")
+            if record.markdown is not None:
+                self._write_stream(record, doc)
+            else:
+                doc.setHtml(self.render(record))
+            self.documents[record.id] = doc
+            while len(self.documents) > self.max_documents:
+                self.streams.pop(self.documents.popitem(last=False)[0], None)
+        else:
+            self.documents.move_to_end(record.id)
+        if doc.textWidth() != width:
+            doc.setTextWidth(width)
+        return doc
+
+    def estimate_height(self, record, width):
+        if record.estimate_width != width:
+            metrics = QFontMetrics(self.font)
+            per_line = max(width // max(metrics.averageCharWidth(), 1), 1)
+            lines = 3 + sum(len(line) // per_line + 1 for line in record.text.split("\n"))
+            record.estimate = lines * metrics.lineSpacing()
+            record.estimate_width = width
+        return record.estimate
+
+    def sizeHint(self, option, index):
+        record = index.data(Qt.ItemDataRole.UserRole)
+        width = self.parent().viewport().width()
+        if record.height_width == width:
+            return QSize(width, record.height)
+        return QSize(width, self.estimate_height(record, width))
+
+    def paint(self, painter, option, index):
+        record = index.data(Qt.ItemDataRole.UserRole)
+        width = option.rect.width()
+        doc = self.document_for(record, width)
+        painter.save()
+        if option.state & QStyle.StateFlag.State_Selected:
+            painter.fillRect(option.rect, QColor(255, 255, 255, 25))
+        painter.translate(QPointF(option.rect.topLeft()))
+        # Only the part on screen: a long reply that is still streaming is repainted every frame.
+        visible = option.rect.intersected(self.parent().viewport().rect()).translated(-option.rect.topLeft())
+        doc.drawContents(painter, QRectF(visible))
+        painter.restore()
+        height = int(doc.size().height())
+        if record.height != height or record.height_width != width:
+            record.height = height
+            record.height_width = width
+            self.sizeHintChanged.emit(index)
+
+
+class ChatView(QListView):
+    reached_top = pyqtSignal()
+
+    def __init__(self, render, frame, parent=None):
+        super().__init__(parent)
+        self.message_model = ChatMessageModel(self)
+        self.delegate = ChatMessageDelegate(render, frame, self)
+        self.setModel(self.message_model)
+        self.setItemDelegate(self.delegate)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollMode.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setUniformItemSizes(False)
+        self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.customContextMenuRequested.connect(self.show_context_menu)
+        self.verticalScrollBar().valueChanged.connect(self.check_reached_top)
+
+    def check_reached_top(self, value):
+        if value == 0 and self.message_model.records:
+            self.reached_top.emit()
+
+    def append_message(self, record):
+        at_bottom = self.verticalScrollBar().value() >= self.verticalScrollBar().maximum() - 4
+        self.message_model.append(record)
+        if at_bottom:
+            self.scrollToBottom()
+
+    def scroll_to_record(self, record):
+        row = self.message_model.row_of(record)
+        if row < 0:
+            return
+        index = self.message_model.index(row)
+        self.scrollTo(index, QAbstractItemView.ScrollHint.PositionAtCenter)
+        self.setCurrentIndex(index)
+
+    def prepend_messages(self, records):
+        bar = self.verticalScrollBar()
+        offset = bar.maximum() - bar.value()
+        self.message_model.prepend(records)
+        self.doItemsLayout()
+        bar.setValue(bar.maximum() - offset)
+
+    def update_message(self, record):
+        if record.markdown is None or not self.delegate.extend_stream(record):
+            self.delegate.forget(record)
+        at_bottom = self.verticalScrollBar().value() >= self.verticalScrollBar().maximum() - 4
+        self.message_model.record_changed(record)
+        if at_bottom:
+            self.scrollToBottom()
+
+    def remove_message(self, record):
+        self.delegate.forget(record)
+        self.message_model.remove(record)
+
+    def clear(self):
+        self.delegate.clear_cache()
+        self.message_model.clear()
+
+    def rerender(self):
+        self.delegate.clear_cache()
+        self.message_model.relayout()
+
+    def show_context_menu(self, pos):
+        index = self.indexAt(pos)
+        if not index.isValid():
+            return
+        menu = QMenu(self)
+        copy_action = menu.addAction("📋 Copy Message")
+        if menu.exec(self.viewport().mapToGlobal(pos)) == copy_action:
+            QApplication.clipboard().setText(index.data(Qt.ItemDataRole.DisplayRole))
+
+
+class SentimentChart(QWidget):
+    """Polarity over the course of a conversation, one smoothed line per role."""
+
+    def __init__(self, series, colors):
+        super().__init__()
+        self.series = series
+        self.colors = colors
+        self.setMinimumSize(480, 220)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        painter.fillRect(self.rect(), QColor("#1e1e1e"))
+        left, top = 36.0, 12.0
+        width, height = self.width() - left - 12, self.height() - top - 24
+        count = max(len(self.series) - 1, 1)
+
+        def point(index, polarity):
+            return QPointF(left + width * index / count, top + height * (1 - polarity) / 2)
+
+        painter.setPen(QPen(QColor("#666666")))
+        for polarity in (1, 0, -1):
+            painter.drawLine(point(0, polarity), point(count, polarity))
+            painter.drawText(QPointF(4, point(0, polarity).y() + 4), str(polarity))
+        # A rolling mean keeps long conversations readable.
+        window = max(1, len(self.series) // 50)
+        for role, color in self.colors.items():
+            values = [(i, p) for i, (r, p) in enumerate(self.series) if r == role and p is not None]
+            line = QPolygonF()
+            for n, (index, _) in enumerate(values):
+                recent = values[max(0, n - window + 1):n + 1]
+                line.append(point(index, sum(p for _, p in recent) / len(recent)))
+            painter.setPen(QPen(QColor(color), 2))
+            painter.drawPolyline(line)
+        painter.setPen(QPen(QColor("#CCCCCC")))
+        painter.drawText(QPointF(left, self.height() - 6), f"message 1 → {len(self.series)}")
+        painter.end()
+
+
+class Conversation:
+    """
+    Everything that belongs to one chat tab. Only the GUI thread touches it; requests
+    receive a snapshot of the messages and report back through signals.
+    """
+
+    def __init__(self, view, ai_model):
+        self.view = view
+        self.ai_model = ai_model
+        self.title = "New Chat"
+        self.closed = False
+        self.chat_history = []
+        self.custom_prompt = ""
+        self.context_window = ContextWindow()
+        self.search_index = TokenIndex()
+        self.indexed_records = {}
+
+        self.session_id = None
+        self.oldest_loaded_id = None
+        self.last_saved_index = 0
+        self.save_log = False
+
+        self.task = None
+        self.signals = None
+        self.request_streams = False
+        self.stream_cancel = threading.Event()
+        self.streaming_record = None
+        self.pending_chunks = []
+        self.pending_cache_key = None
+        self.pending_usage = {}
+        self.pending_model = ai_model
+        self.chunk_timer = QTimer(view)
+        self.chunk_timer.setSingleShot(True)
+        self.chunk_timer.setInterval(16)  # flush at most once per frame
+
+    def reset(self):
+        self.chat_history.clear()
+        self.context_window.reset()
+        self.search_index.clear()
+        self.indexed_records.clear()
+        self.streaming_record = None
+        self.session_id = None
+        self.oldest_loaded_id = None
+        self.last_saved_index = 0
+        self.view.clear()
 
 
 class AIChatApp(QWidget):
-    def __init__(self):
+    def __init__(self, profile_startup=False):
         super().__init__()
         self.setWindowTitle("GROQ AI Chatbot")
         self.setGeometry(200, 200, 800, 600)
@@ -64,30 +494,58 @@ class AIChatApp(QWidget):
         self.ai_chat_color = "#FFFFFF"
 
         self.ai_model = "llama3-8b-8192"
-        self.model_mapping = {
-            "🤖 Llama3 8B": "llama3-8b-8192",
-            "🧠 Mixtral 8x7B": "mixtral-8x7b-32768",
-            "🚀 Llama3 70B": "llama3-70b-8192",
-            "🛡️ Llama Guard 3 8B": "llama-guard-3-8b",
-            "🔐 Gemma 2 9B": "gemma2-9b-it",
-            "💀 Llama 3.3 70B SpecDec": "llama-3.3-70b-specdec",
-            "🕵️ Llama 3.2 11B Vision Preview": "llama-3.2-11b-vision-preview",
-            "⚡ DeepSeek-R1": "deepseek-r1-distill-llama-70b"
-        }
+        self.model_mapping = MODEL_MAPPING
 
         self.save_log = False
-        self.chat_history = []
-        self.custom_prompt = ""
-        self.prompt_set = False
+        self.sampling_params = {}
 
-        self.code_snippets = {}
-        self.next_code_id = 1
+        self.response_cache = ResponseCache()
+        self.sentiment = SentimentScorer()
+        self.sentiment_busy = False
+        self.sentiment_window = None
+        self.use_cache = True
 
-        self.last_saved_index = 0
-        self.tts_engine = pyttsx3.init()
+        self.snippets = SnippetStore()
+        self.snippet_records = {}
+        self.results_window = None
+        self.metrics_window = None
+        self.snippet_window = None
+        self.pending_highlights = {}
+
+        self.session_store = None
+        self.session_page_size = 50
+        self.export_cancels = set()
+        self.save_signals = WorkerSignals()
+        self.save_signals.result.connect(self.handle_message_saved)
+        self.speech_signals = WorkerSignals()
+        self.speech_signals.error.connect(self.handle_speech_error)
+        self.speech = SpeechQueue(on_error=self.speech_signals.error.emit)
+        self.auto_speak = False
+        self.spoken_record = None
+        self.profile_startup = profile_startup
+        self.warm_up_started = False
 
         self.ai_reply_font = QFont("Arial", 12)
         self.threadpool = QThreadPool()
+        self.sentiment_timer = QTimer(self)
+        self.sentiment_timer.setSingleShot(True)
+        self.sentiment_timer.setInterval(300)
+        self.sentiment_timer.timeout.connect(self.score_new_messages)
+        self.runner = AsyncRunner()
+        self.telemetry = Telemetry()
+        self.scheduler = RequestScheduler(get_client, telemetry=self.telemetry)
+        self.router = LatencyRouter(self.model_mapping.values())
+        self.telemetry.listeners.append(self.router.observe)
+        self.race_size = 3
+        # Set GROQ_AI_METRICS_FILE to keep a Prometheus text file (or .jsonl) up to date for scraping.
+        self.metrics_path = os.environ.get("GROQ_AI_METRICS_FILE")
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(10000)
+        self.metrics_timer.timeout.connect(self.write_metrics_file)
+        if self.metrics_path:
+            self.metrics_timer.start()
+
+        self.stream_responses = True
 
         self.initUI()
 
@@ -108,10 +566,16 @@ class AIChatApp(QWidget):
         top_controls_layout.addWidget(self.set_prompt_button)
         layout.addLayout(top_controls_layout)
 
-        self.chat_display = QTextBrowser()
-        self.chat_display.setReadOnly(True)
-        self.chat_display.setStyleSheet(f"background-color: {self.bg_color}; color: white; font-size: 14px;")
-        layout.addWidget(self.chat_display)
+        self.tabs = QTabWidget()
+        self.tabs.setTabsClosable(True)
+        self.tabs.setMovable(True)
+        self.tabs.tabCloseRequested.connect(self.close_conversation)
+        self.tabs.currentChanged.connect(self.on_tab_changed)
+        self.new_tab_button = QPushButton("➕")
+        self.new_tab_button.setToolTip("New chat tab")
+        self.new_tab_button.clicked.connect(self.new_conversation)
+        self.tabs.setCornerWidget(self.new_tab_button, Qt.Corner.TopRightCorner)
+        layout.addWidget(self.tabs)
 
         input_layout = QHBoxLayout()
         self.input_field = QLineEdit()
@@ -133,6 +597,10 @@ class AIChatApp(QWidget):
         self.send_button = QPushButton("Send 🚀")
         self.send_button.clicked.connect(self.send_message)
         buttons_layout.addWidget(self.send_button)
+        self.stop_button = QPushButton("Stop ⏹")
+        self.stop_button.setEnabled(False)
+        self.stop_button.clicked.connect(self.stop_ai_response)
+        buttons_layout.addWidget(self.stop_button)
         self.speak_button = QPushButton("Speak AI 🔊")
         self.speak_button.clicked.connect(self.speak_last_ai_message)
         buttons_layout.addWidget(self.speak_button)
@@ -146,15 +614,36 @@ class AIChatApp(QWidget):
             "QMenu::item { padding: 5px 25px; }"
             "QMenu::item:selected { background-color: #555555; }"
         )
+        self.settings_menu.addAction(self.create_action("🗂 New Chat Tab", self.new_conversation))
         self.settings_menu.addAction(self.create_action("💾 Toggle Save Log (ON/OFF)", self.toggle_save_log))
+        self.settings_menu.addAction(self.create_action("📂 Open Past Session", self.open_past_session))
+        self.settings_menu.addAction(self.create_action("⚡ Toggle Streaming (ON/OFF)", self.toggle_streaming))
+        self.settings_menu.addAction(self.create_action("🪁 Toggle Request Hedging (ON/OFF)", self.toggle_hedging))
+        self.settings_menu.addAction(self.create_action("📈 Performance Metrics", self.show_metrics_panel))
+        self.settings_menu.addAction(self.create_action("📏 Set Context Budget", self.set_context_budget))
+        self.cache_action = self.create_action("🗃 Response Cache", self.toggle_response_cache)
+        self.settings_menu.addAction(self.cache_action)
+        self.settings_menu.aboutToShow.connect(self.update_cache_action)
+        self.settings_menu.addAction(
+            self.create_action("🗜 Toggle Context Summary (ON/OFF)", self.toggle_context_summary))
         self.settings_menu.addAction(self.create_action("📝 Export Chat to PDF", self.export_chat_to_pdf))
         self.settings_menu.addAction(self.create_action("📝 Export Chat to Markdown", self.export_chat_to_markdown))
+        self.settings_menu.addAction(self.create_action("📦 Export Saved Session", self.export_saved_session))
         self.settings_menu.addAction(self.create_action("🔍 Analyze Last AI Sentiment", self.show_last_ai_sentiment))
+        self.settings_menu.addAction(
+            self.create_action("📊 Conversation Sentiment", self.show_conversation_sentiment))
+        self.settings_menu.addAction(
+            self.create_action("📊 Saved Session Sentiment", self.show_saved_session_sentiment))
+        self.settings_menu.addAction(self.create_action("🔊 Toggle Auto-Speak (ON/OFF)", self.toggle_auto_speak))
+        self.settings_menu.addAction(self.create_action("⏯ Pause/Resume Speech", self.toggle_speech_pause))
+        self.settings_menu.addAction(self.create_action("⏭ Skip Spoken Sentence", self.speech.skip))
+        self.settings_menu.addAction(self.create_action("🔇 Stop Speech", self.stop_speech))
         self.settings_menu.addAction(
             self.create_action("🗣️ Speech-to-Text (coming soon)", self.speech_to_text_placeholder))
         self.settings_menu.addAction(self.create_action("🧹 Clear Chat", self.clear_chat))
         self.settings_menu.addAction(self.create_action("🖋 Change AI Reply Formatting", self.change_ai_reply_font))
         self.settings_menu.addAction(self.create_action("💾 Save Snippet", self.save_snippet))
+        self.settings_menu.addAction(self.create_action("🧩 Browse Snippets", self.show_snippet_browser))
         self.settings_menu.addAction(self.create_action("📋 Export Code Snippets", self.export_code_snippets))
         self.settings_button.setMenu(self.settings_menu)
         secondary_layout.addWidget(self.settings_button)
@@ -175,15 +664,69 @@ class AIChatApp(QWidget):
         layout.addLayout(secondary_layout)
 
         self.model_selector = QComboBox()
-        for display in self.model_mapping.keys():
+        for display in list(self.model_mapping) + list(ROUTING_MODES):
             self.model_selector.addItem(display)
         self.model_selector.currentIndexChanged.connect(self.change_model)
         layout.addWidget(QLabel("Change AI Model:"))
         layout.addWidget(self.model_selector)
 
         self.setLayout(layout)
+        self.new_conversation()
         self.update_style()
 
+    @property
+    def conversation(self) -> Conversation:
+        return self.tabs.currentWidget().conversation
+
+    @property
+    def conversations(self) -> list:
+        return [self.tabs.widget(index).conversation for index in range(self.tabs.count())]
+
+    def new_conversation(self):
+        view = ChatView(self.render_message, self.message_frame)
+        conversation = Conversation(view, self.ai_model)
+        conversation.save_log = self.save_log
+        view.conversation = conversation
+        view.reached_top.connect(lambda conv=conversation: self.load_older_messages(conv))
+        conversation.chunk_timer.timeout.connect(lambda conv=conversation: self.flush_pending_chunks(conv))
+        view.setStyleSheet(f"background-color: {self.bg_color}; color: white; font-size: 14px;")
+        self.tabs.setCurrentIndex(self.tabs.addTab(view, conversation.title))
+        return conversation
+
+    def close_conversation(self, index: int):
+        conversation = self.tabs.widget(index).conversation
+        conversation.closed = True
+        conversation.chunk_timer.stop()
+        self.cancel_request(conversation)
+        self.forget_snippets(conversation)
+        self.tabs.removeTab(index)
+        conversation.view.deleteLater()
+        if self.tabs.count() == 0:
+            self.new_conversation()
+
+    def on_tab_changed(self, index: int):
+        if index < 0:
+            return
+        conversation = self.tabs.widget(index).conversation
+        modes = {**self.model_mapping, **ROUTING_MODES}
+        display = next((d for d, model in modes.items() if model == conversation.ai_model), None)
+        if display is not None:
+            self.model_selector.blockSignals(True)
+            self.model_selector.setCurrentText(display)
+            self.model_selector.blockSignals(False)
+        self.update_request_buttons()
+
+    def update_request_buttons(self):
+        busy = self.conversation.task is not None
+        self.send_button.setEnabled(not busy)
+        self.stop_button.setEnabled(busy)
+
+    def rename_tab(self, conversation, title: str):
+        conversation.title = title
+        index = self.tabs.indexOf(conversation.view)
+        if index >= 0:
+            self.tabs.setTabText(index, title if len(title) <= 24 else title[:23] + "…")
+
     def insert_emoji(self, emoji: str):
         current_text = self.input_field.text()
         self.input_field.setText(current_text + emoji)
@@ -197,12 +740,14 @@ class AIChatApp(QWidget):
     def set_custom_prompt(self):
         prompt = self.prompt_input.text().strip()
         if prompt:
-            self.custom_prompt = prompt
-            self.prompt_set = False
+            self.conversation.custom_prompt = prompt
             self.display_message("System", f"Custom prompt set: {prompt}", "#FFA500", "#FFFFFF")
             self.prompt_input.clear()
 
     def send_message(self):
+        conv = self.conversation
+        if conv.task is not None:
+            return
         user_input = self.input_field.text().strip()
         if not user_input:
             return
@@ -210,94 +755,311 @@ class AIChatApp(QWidget):
             self.close()
             return
 
-        self.display_message("You", user_input, self.user_label_color, self.user_chat_color)
-        self.chat_history.append({"role": "user", "content": user_input})
+        if conv.title == "New Chat":
+            self.rename_tab(conv, user_input)
+        record = self.display_message("You", user_input, self.user_label_color, self.user_chat_color)
+        conv.chat_history.append({
+            "role": "user", "content": user_input, "model": conv.ai_model, "created": time.time(),
+            "record_id": record.id
+        })
+        self.sentiment_timer.start()
         self.input_field.clear()
-        self.send_button.setEnabled(False)
-        worker = Worker(self.get_ai_response)
-        worker.signals.result.connect(self.handle_ai_response)
-        worker.signals.error.connect(self.handle_worker_error)
-        worker.signals.finished.connect(lambda: self.send_button.setEnabled(True))
-        self.threadpool.start(worker)
+        conv.stream_cancel.clear()
+        models = self.route(conv)
+        # Trim the history for the smallest context among the models that will see it.
+        model = min(models, key=context_size)
+        messages = conv.context_window.build(conv.chat_history, model, conv.custom_prompt)
+        conv.pending_cache_key = None
+        conv.pending_usage = {}
+        conv.pending_model = model
+        if self.use_cache:
+            cache_key = make_key(conv.ai_model if conv.ai_model == FASTEST else model, messages, self.sampling_params)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                self.handle_ai_response(conv, cached)
+                return
+            conv.pending_cache_key = cache_key
+        self.start_request(conv, messages, models)
+
+    def route(self, conv) -> list:
+        """The model(s) to send the next request to: the tab's own, the router's pick, or several to race."""
+        if conv.ai_model not in (AUTO, FASTEST):
+            return [conv.ai_model]
+        conv.context_window.sync(conv.chat_history)
+        prompt_tokens = conv.context_window.total_tokens + estimate_tokens(conv.custom_prompt)
+        if conv.ai_model == AUTO:
+            return [self.router.choose(prompt_tokens)]
+        return self.router.race_candidates(prompt_tokens, self.race_size)
 
-    def get_ai_response(self) -> str:
-        if self.custom_prompt and not self.prompt_set:
-            self.chat_history.insert(0, {"role": "system", "content": self.custom_prompt})
-            self.prompt_set = True
+    def start_request(self, conv, messages, models=None):
+        signals = WorkerSignals()
+        stream = self.stream_responses
+        if stream:
+            signals.chunk.connect(lambda delta, conv=conv: self.handle_ai_chunk(conv, delta))
+        signals.usage.connect(lambda usage, conv=conv: conv.pending_usage.update(usage))
+        signals.result.connect(lambda ai_response, conv=conv: self.handle_ai_response(conv, ai_response))
+        signals.error.connect(lambda error, conv=conv: self.handle_request_error(conv, error))
+        signals.finished.connect(lambda conv=conv: self.handle_ai_finished(conv))
+        conv.signals = signals
+        conv.request_streams = stream
+        conv.task = self.runner.submit(self.run_request(
+            signals, models or [conv.pending_model], messages, stream, dict(self.sampling_params), conv.stream_cancel))
+        self.update_request_buttons()
+
+    async def run_request(self, signals, models, messages, stream, params, cancel):
+        usage = {}
         try:
-            response = client.chat.completions.create(
-                model=self.ai_model,
-                messages=self.chat_history
-            )
-            return response.choices[0].message.content
+            if len(models) == 1:
+                ai_response = await self.get_ai_response(
+                    models[0], messages, stream=stream, on_chunk=signals.chunk.emit, usage=usage,
+                    cancel=cancel, params=params)
+            else:
+                ai_response, usage["model"] = await race(
+                    self.scheduler, models, messages, params, stream=stream, on_chunk=signals.chunk.emit,
+                    usage=usage, cancel=cancel)
         except Exception as e:
-            return f"Error: {e}"
+            signals.error.emit(e)
+        else:
+            signals.usage.emit(usage)
+            signals.result.emit(ai_response)
+        finally:
+            signals.finished.emit()
 
-    def handle_ai_response(self, ai_response: str):
-        self.display_message("AI Assistant", ai_response, self.ai_label_color, self.ai_chat_color)
-        self.chat_history.append({"role": "assistant", "content": ai_response})
-        if self.save_log:
-            self.save_chat_log()
+    async def get_ai_response(self, model, messages, stream=False, on_chunk=None, usage=None,
+                              cancel=None, params=None) -> str:
+        """Send the request through the scheduler; API errors are raised after retries run out."""
+        return await self.scheduler.request(
+            model, messages, params, stream=stream, on_chunk=on_chunk, usage=usage, cancel=cancel)
+
+    def cancel_request(self, conv):
+        conv.stream_cancel.set()
+        if conv.task is not None and not conv.request_streams:
+            conv.task.cancel()
+
+    def stop_ai_response(self):
+        self.cancel_request(self.conversation)
+        self.stop_button.setEnabled(False)
+
+    def handle_ai_chunk(self, conv, delta: str):
+        if conv.closed:
+            return
+        conv.pending_chunks.append(delta)
+        if not conv.chunk_timer.isActive():
+            conv.chunk_timer.start()
+
+    def flush_pending_chunks(self, conv):
+        if not conv.pending_chunks:
+            return
+        text = "".join(conv.pending_chunks)
+        conv.pending_chunks.clear()
+        if conv.streaming_record is None:
+            conv.streaming_record = ChatMessage(
+                "AI Assistant", text, self.ai_label_color, self.ai_chat_color, streaming=True)
+            conv.streaming_record.markdown = MarkdownRenderer(lambda code, language: self.code_box(plain_code(code)))
+            conv.streaming_record.markdown.feed(text)
+            conv.view.append_message(conv.streaming_record)
+            if self.auto_speak and conv is self.conversation:
+                self.speech.stop()
+                self.spoken_record = conv.streaming_record
+        else:
+            conv.streaming_record.text += text
+            conv.streaming_record.markdown.feed(text)
+            conv.view.update_message(conv.streaming_record)
+        if conv.streaming_record is self.spoken_record:
+            self.speech.feed(text)
+
+    def finish_streamed_message(self, conv, final_text=None):
+        """Turn the plain-text streaming preview into a fully formatted message."""
+        conv.chunk_timer.stop()
+        # Deltas still waiting for the frame timer belong to the message (and to the speech queue),
+        # also when the stream failed or was stopped.
+        self.flush_pending_chunks(conv)
+        record = conv.streaming_record
+        if record is None:
+            return None
+        conv.streaming_record = None
+        if record is self.spoken_record:
+            self.spoken_record = None
+            self.speech.finish()
+        if final_text is not None:
+            record.text = final_text
+        if not record.text:
+            conv.view.remove_message(record)
+            return None
+        record.streaming = False
+        record.markdown = None
+        self.register_record(conv, record)
+        conv.view.update_message(record)
+        return record
+
+    def handle_ai_response(self, conv, ai_response: str):
+        if conv.closed:
+            return
+        record = self.finish_streamed_message(conv, ai_response)
+        if record is None and ai_response:
+            record = self.display_message(
+                "AI Assistant", ai_response, self.ai_label_color, self.ai_chat_color, conversation=conv)
+            if self.auto_speak and conv is self.conversation:
+                self.speech.stop()
+                self.speech.speak(ai_response)
+        if not ai_response:
+            return
+        # A race reports the model that won alongside the token usage.
+        model = conv.pending_usage.pop("model", conv.pending_model)
+        conv.chat_history.append({
+            "role": "assistant", "content": ai_response, "model": model,
+            "created": time.time(), "record_id": record.id, **conv.pending_usage
+        })
+        self.sentiment_timer.start()
+        if conv.pending_cache_key and not conv.stream_cancel.is_set():
+            self.response_cache.put(conv.pending_cache_key, ai_response)
+        conv.pending_cache_key = None
+        if conv.save_log:
+            self.save_chat_log(conv)
+
+    def handle_ai_finished(self, conv):
+        conv.task = None
+        conv.signals = None
+        if conv.closed:
+            return
+        self.finish_streamed_message(conv)
+        if conv is self.conversation:
+            self.update_request_buttons()
 
     def handle_worker_error(self, error: Exception):
         QMessageBox.critical(self, "Error", f"An error occurred: {error}")
 
-    def format_ai_text(self, text: str) -> str:
-        text = text.replace("\n", "<br>")
-        formatted = re.sub(r'(?<!^)(?<!<br>)(\d{2,}\.\s)', r'<br>\1', text)
-        return formatted
+    def handle_request_error(self, conv, error: Exception):
+        if conv.closed:
+            return
+        self.finish_streamed_message(conv)
+        self.display_message("System", f"Request failed: {error}", "#FFA500", "#FFFFFF", conversation=conv)
 
-    def format_code_snippet(self, code_text: str, code_id: int) -> str:
+    def format_code_snippet(self, code_text: str, code_id: int, language=None) -> str:
         header = f"<div style='font-weight: bold; color: #FFD700;'>Snippet {code_id}</div>"
-        try:
-            lexer = guess_lexer(code_text)
-        except Exception:
-            lexer = PythonLexer()
-        formatter = HtmlFormatter(nowrap=True, noclasses=True, style='monokai')
-        highlighted = highlight(code_text, lexer, formatter)
-        snippet_div = (
+        highlighted = cached_highlight(code_text, language)
+        if highlighted is None:
+            # This runs while painting, so highlighting always happens on the thread pool.
+            self.highlight_in_background(code_text, code_id, language)
+            highlighted = plain_code(code_text)
+        return header + self.code_box(highlighted)
+
+    def code_box(self, code_html: str) -> str:
+        return (
             f"<div style='background-color: black; padding: 10px; border-radius: 5px; "
-            f"white-space: pre-wrap; overflow:auto;'>```{highlighted}```</div>"
+            f"white-space: pre-wrap; overflow:auto;'>```{code_html}```</div>"
         )
-        return header + snippet_div
-
-    def auto_format_code_snippets(self, text: str) -> str:
-        def repl_manual(match):
-            code_content = match.group(1)
-            code_id = self.next_code_id
-            self.next_code_id += 1
-            self.code_snippets[code_id] = code_content
-            return self.format_code_snippet(code_content, code_id)
-
-        pattern = re.compile(r"```(?:[a-zA-Z]+)?\n(.*?)```", re.DOTALL)
-        new_text = pattern.sub(repl_manual, text)
-        if new_text == text:
-            lines = text.splitlines()
-            if len(lines) >= 3:
-                code_indicators = ["def ", "elif ", "{", "}", ";"]
-                score = sum(1 for indicator in code_indicators if indicator in text)
-                if score >= 2:
-                    code_id = self.next_code_id
-                    self.next_code_id += 1
-                    self.code_snippets[code_id] = text
-                    new_text = self.format_code_snippet(text, code_id)
-        return new_text
-
-    def display_message(self, sender, message, label_color, text_color):
-        separator = "<br>━━━━━━━━━━━━✦━━━━━━━━━━━━<br>"
-        message = self.auto_format_code_snippets(message)
-        if sender == "AI Assistant":
-            message = self.format_ai_text(message)
+
+    def highlight_in_background(self, code_text: str, code_id: int, language=None):
+        key = cache_key(code_text, language)
+        waiting = self.pending_highlights.get(key)
+        if waiting is not None:
+            waiting.add(code_id)
+            return
+        self.pending_highlights[key] = {code_id}
+        worker = Worker(highlight_snippet, code_text, language)
+        if language is None:
+            worker.signals.result.connect(lambda result, key=key: self.store_detected_language(key, result[0]))
+        worker.signals.finished.connect(lambda key=key: self.handle_highlight_done(key))
+        self.threadpool.start(worker)
+
+    def store_detected_language(self, key: str, language):
+        """Keep the language a highlight job detected, so saving the snippet agrees with how it looks."""
+        if not language:
+            return
+        for code_id in self.pending_highlights.get(key, ()):
+            snippet = self.snippets.get(code_id)
+            if snippet is not None and not snippet["language"]:
+                self.snippets.set_language(code_id, language)
+
+    def handle_highlight_done(self, key: str):
+        for code_id in self.pending_highlights.pop(key, ()):
+            for conv, record in self.snippet_records.get(code_id, ()):
+                conv.view.update_message(record)
+
+    def register_code_snippets(self, conv, record) -> list:
+        """Add the record's code blocks to the snippet store; identical code gets the same id everywhere."""
+        return [
+            self.snippets.add(code, language, conv.session_id, record.message_id, conv.title, record.role,
+                              source_key=record.id)
+            for language, code in extract_code_snippets(record.text)
+        ]
+
+    def forget_snippets(self, conv):
+        """Drop a conversation's snippet references, letting the store move unused snippets out of memory."""
+        unused = []
+        for code_id, owners in list(self.snippet_records.items()):
+            owners[:] = [(owner, record) for owner, record in owners if owner is not conv]
+            if not owners:
+                del self.snippet_records[code_id]
+                unused.append(code_id)
+        self.snippets.release(unused)
+
+    def format_markdown(self, text: str, code_ids) -> str:
+        """Render a finished message in one pass, numbering and highlighting its snippets."""
+        remaining = iter(code_ids)
+
+        def code_block(code, language):
+            code_id = next(remaining, None)
+            if code_id is None:
+                return self.code_box(plain_code(code))
+            return self.format_code_snippet(code, code_id, language)
+
+        renderer = MarkdownRenderer(code_block)
+        rendered = renderer.feed(text) + renderer.finish()
+        if not renderer.code_blocks and code_ids:
+            # Unfenced text that looked like code was registered as a snippet as a whole.
+            return self.format_code_snippet(text, code_ids[0])
+        return rendered
+
+    def register_record(self, conv, record):
+        record.code_ids = self.register_code_snippets(conv, record)
+        for code_id in record.code_ids:
+            self.snippet_records.setdefault(code_id, []).append((conv, record))
+        conv.indexed_records[record.id] = record
+        conv.search_index.add(record.id, record.role, record.text)
+
+    def create_record(self, conv, sender, message, label_color, text_color, message_id=None):
+        record = ChatMessage(sender, message, label_color, text_color)
+        record.message_id = message_id
+        self.register_record(conv, record)
+        return record
+
+    def display_message(self, sender, message, label_color, text_color, conversation=None):
+        conv = conversation or self.conversation
+        record = self.create_record(conv, sender, message, label_color, text_color)
+        conv.view.append_message(record)
+        return record
+
+    def record_for_stored_message(self, conv, message):
+        message_id = message.get("id")
+        if message["role"] == "user":
+            return self.create_record(
+                conv, "You", message["content"], self.user_label_color, self.user_chat_color, message_id)
+        if message["role"] == "assistant":
+            return self.create_record(
+                conv, "AI Assistant", message["content"], self.ai_label_color, self.ai_chat_color, message_id)
+        return self.create_record(conv, "System", message["content"], "#FFA500", "#FFFFFF", message_id)
+
+    def message_frame(self, record):
+        """The sender label, and the opening tag of the span that styles the message body."""
+        label = f"<span style='color:{record.label_color};'><b>{record.sender}:</b></span>"
+        if record.sender == "AI Assistant":
             font_style = f"font-family: {self.ai_reply_font.family()}; font-size: {self.ai_reply_font.pointSize()}pt; "
             if self.ai_reply_font.bold():
                 font_style += "font-weight: bold; "
             if self.ai_reply_font.italic():
                 font_style += "font-style: italic; "
-            formatted_message = f"<span style='{font_style}color:{text_color};'>{message}</span>"
+            return label, f"<span style='{font_style}color:{record.text_color};'>"
+        return label, f"<span style='color:{record.text_color};'>"
+
+    def render_message(self, record) -> str:
+        if record.markdown is not None:
+            message = record.markdown.html + html.escape(record.markdown.pending()).replace("\n", "<br>")
         else:
-            formatted_message = f"<span style='color:{text_color};'>{message}</span>"
-        self.chat_display.append(f"<span style='color:{label_color};'><b>{sender}:</b></span> {formatted_message}{separator}")
-        self.chat_display.moveCursor(QTextCursor.MoveOperation.End)
+            message = self.format_markdown(record.text, record.code_ids)
+        label, span = self.message_frame(record)
+        return f"{label} {span}{message}</span>{MESSAGE_SEPARATOR}"
 
     def change_color(self, target):
         selected_color = QColorDialog.getColor()
@@ -321,161 +1083,711 @@ class AIChatApp(QWidget):
 
     def change_model(self):
         selected_display = self.model_selector.currentText()
-        self.ai_model = self.model_mapping[selected_display]
+        self.ai_model = self.model_mapping.get(selected_display) or ROUTING_MODES[selected_display]
+        self.conversation.ai_model = self.ai_model
 
     def toggle_save_log(self):
         self.save_log = not self.save_log
+        for conv in self.conversations:
+            conv.save_log = self.save_log
+            if self.save_log and conv.chat_history:
+                self.save_chat_log(conv)
         state = "ON" if self.save_log else "OFF"
         QMessageBox.information(self, "Save Log", f"Chat log saving is now {state}.")
 
-    def save_chat_log(self):
+    def toggle_streaming(self):
+        self.stream_responses = not self.stream_responses
+        state = "ON" if self.stream_responses else "OFF"
+        QMessageBox.information(self, "Streaming", f"Streaming responses is now {state}.")
+
+    def toggle_hedging(self):
+        self.scheduler.hedge = not self.scheduler.hedge
+        state = "ON" if self.scheduler.hedge else "OFF"
+        QMessageBox.information(
+            self, "Request Hedging",
+            f"Request hedging is now {state}. Slow non-streamed replies get a second request after the model's p95 latency.")
+
+    def show_metrics_panel(self):
+        if self.metrics_window is None:
+            metrics_window = QWidget()
+            metrics_window.setWindowTitle("Performance Metrics")
+            layout = QVBoxLayout(metrics_window)
+            self.metrics_browser = QTextBrowser()
+            layout.addWidget(self.metrics_browser)
+            buttons = QHBoxLayout()
+            for label, callback in (("Export Prometheus…", lambda: self.export_metrics("groq_ai_metrics.prom")),
+                                    ("Export JSONL…", lambda: self.export_metrics("groq_ai_metrics.jsonl")),
+                                    ("Reset", self.reset_metrics)):
+                button = QPushButton(label)
+                button.clicked.connect(callback)
+                buttons.addWidget(button)
+            layout.addLayout(buttons)
+            metrics_window.resize(720, 320)
+            self.metrics_refresh_timer = QTimer(metrics_window)
+            self.metrics_refresh_timer.setInterval(2000)
+            self.metrics_refresh_timer.timeout.connect(self.refresh_metrics_panel)
+            self.metrics_window = metrics_window
+        self.metrics_window.show()
+        self.metrics_window.raise_()
+        self.refresh_metrics_panel()
+        self.metrics_refresh_timer.start()
+
+    def refresh_metrics_panel(self):
+        if not self.metrics_window.isVisible():
+            self.metrics_refresh_timer.stop()
+            return
+        names = {model_id: name for name, model_id in self.model_mapping.items()}
+
+        def cell(timing, scale=1000.0, unit="ms"):
+            if timing["p50"] is None:
+                return "<td>–</td>"
+            return f"<td>{timing['p50'] * scale:.0f} / {timing['p95'] * scale:.0f} {unit}</td>"
+
+        rows = []
+        for model, stats in sorted(self.telemetry.summary().items()):
+            rows.append(
+                f"<tr><td>{html.escape(names.get(model, model))}</td><td>{stats['count']}</td><td>{stats['errors']}</td>"
+                + cell(stats["queue_wait"]) + cell(stats["ttft"]) + cell(stats["latency"])
+                + cell(stats["tokens_per_sec"], 1.0, "tok/s") + "</tr>")
+        if not rows:
+            rows.append("<tr><td colspan='7'>No requests yet.</td></tr>")
+        self.metrics_browser.setHtml(
+            "<p>Rolling p50 / p95 over each model's last "
+            f"{self.telemetry.window} requests.</p>"
+            "<table border='1' cellspacing='0' cellpadding='4'><tr><th>Model</th><th>Requests</th><th>Errors</th>"
+            "<th>Queue wait</th><th>First token</th><th>Latency</th><th>Speed</th></tr>"
+            + "".join(rows) + "</table>")
+
+    def export_metrics(self, default_name):
+        file_filter = "JSON Lines (*.jsonl)" if default_name.endswith(".jsonl") else "Prometheus Text (*.prom *.txt)"
+        path, _ = QFileDialog.getSaveFileName(self.metrics_window, "Export Metrics", default_name, file_filter)
+        if not path:
+            return
         try:
-            with open("chat_log.txt", "a", encoding="utf-8") as file:
-                for message in self.chat_history[self.last_saved_index:]:
-                    file.write(f"{message['role'].capitalize()}: {message['content']}\n")
-                file.write("-" * 50 + "\n")
-            self.last_saved_index = len(self.chat_history)
+            self.telemetry.write(path)
         except Exception as e:
-            QMessageBox.critical(self, "Save Log Error", f"Error saving log: {e}")
+            QMessageBox.critical(self.metrics_window, "Export Metrics", f"Failed to export metrics: {e}")
 
-    def export_chat_to_pdf(self):
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font("Arial", size=12)
-        for msg in self.chat_history:
-            role = msg['role'].capitalize()
-            content = msg['content']
-            pdf.multi_cell(0, 10, f"{role}: {content}")
-            pdf.ln()
+    def reset_metrics(self):
+        self.telemetry.clear()
+        self.refresh_metrics_panel()
+
+    def write_metrics_file(self):
         try:
-            pdf.output("chat_history.pdf")
-            QMessageBox.information(self, "Export to PDF", "Chat history exported to chat_history.pdf")
-        except Exception as e:
-            QMessageBox.critical(self, "Export to PDF", f"Failed to export PDF: {e}")
+            self.telemetry.write(self.metrics_path)
+        except OSError as e:
+            self.metrics_timer.stop()
+            QMessageBox.critical(self, "Metrics", f"Failed to write {self.metrics_path}: {e}")
 
-    def export_chat_to_markdown(self):
+    def set_context_budget(self):
+        conv = self.conversation
+        model = conv.ai_model
+        if model in (FASTEST, AUTO):
+            # Budgets apply to the model a request is actually sent to, so ask which one.
+            names = list(self.model_mapping)
+            name, ok = QInputDialog.getItem(self, "Context Budget", "Set the budget for which model?", names, 0, False)
+            if not ok:
+                return
+            model = self.model_mapping[name]
+        current = conv.context_window.budget_for(model)
+        budget, ok = QInputDialog.getInt(
+            self, "Context Budget",
+            f"Token budget for {model} (history is ~{conv.context_window.total_tokens} tokens):",
+            current, 256, 1_000_000, 256)
+        if ok:
+            conv.context_window.set_budget(model, budget)
+
+    def toggle_context_summary(self):
+        context_window = self.conversation.context_window
+        context_window.summarize = not context_window.summarize
+        state = "ON" if context_window.summarize else "OFF"
+        QMessageBox.information(self, "Context Summary", f"Summarizing older turns is now {state}.")
+
+    def toggle_response_cache(self):
+        self.use_cache = not self.use_cache
+
+    def update_cache_action(self):
+        cache = self.response_cache
+        state = "ON" if self.use_cache else "OFF"
+        self.cache_action.setText(
+            f"🗃 Response Cache: {state} (hits {cache.hits} / misses {cache.misses})")
+
+    def get_session_store(self):
+        if self.session_store is None:
+            self.session_store = SessionStore()
+        return self.session_store
+
+    def save_chat_log(self, conv=None):
+        conv = conv or self.conversation
         try:
-            with open("chat_history.md", "w", encoding="utf-8") as file:
-                for msg in self.chat_history:
-                    role = msg['role'].capitalize()
-                    content = msg['content']
-                    file.write(f"**{role}:**\n\n{content}\n\n---\n\n")
-            QMessageBox.information(self, "Export to Markdown", "Chat history exported to chat_history.md")
+            store = self.get_session_store()
+            if conv.session_id is None:
+                title = next((m["content"] for m in conv.chat_history if m["role"] == "user"), "New chat")
+                conv.session_id = store.create_session(title, conv.ai_model)
+            for message in conv.chat_history[conv.last_saved_index:]:
+                store.append(
+                    conv.session_id, message["role"], message["content"], message.get("model"),
+                    message.get("created"), message.get("prompt_tokens"), message.get("completion_tokens"),
+                    message.get("polarity"), message.get("subjectivity"),
+                    on_saved=self.message_saver(conv, message)
+                )
+            conv.last_saved_index = len(conv.chat_history)
         except Exception as e:
-            QMessageBox.critical(self, "Export to Markdown", f"Failed to export Markdown: {e}")
+            QMessageBox.critical(self, "Save Log Error", f"Error saving log: {e}")
 
-    def export_code_snippets(self):
+    def message_saver(self, conv, message):
+        """Called by the store's writer thread with the id a message was saved under."""
+        session_id, title, record_id = conv.session_id, conv.title, message.get("record_id")
+
+        def on_saved(message_id):
+            if record_id is not None:
+                self.snippets.saved(record_id, session_id, message_id, title)
+            try:
+                self.save_signals.result.emit((conv, message, message_id))
+            except RuntimeError:
+                pass
+        return on_saved
+
+    def handle_message_saved(self, saved):
+        conv, message, message_id = saved
+        message["id"] = message_id
+        record = conv.indexed_records.get(message.get("record_id"))
+        if record is not None:
+            record.message_id = message_id
+        # Scored while it was waiting to be written, so the row was stored without a score.
+        self.store_sentiment([message])
+
+    def choose_session(self, title):
         try:
-            with open("code_snippets.txt", "w", encoding="utf-8") as file:
-                for code_id, code in self.code_snippets.items():
-                    file.write(f"--- Snippet {code_id} ---\n")
-                    file.write(code + "\n\n")
-            QMessageBox.information(self, "Export Code Snippets", "Code snippets exported to code_snippets.txt")
+            sessions = self.get_session_store().list_sessions()
         except Exception as e:
-            QMessageBox.critical(self, "Export Code Snippets", f"Failed to export code snippets: {e}")
+            QMessageBox.critical(self, title, f"Failed to read sessions: {e}")
+            return None
+        if not sessions:
+            QMessageBox.information(self, title, "No saved sessions yet.")
+            return None
+        labels = [
+            f"#{session['id']} {session['title'][:50]} ({session['message_count']} messages, "
+            f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(session['updated']))})"
+            for session in sessions
+        ]
+        choice, ok = QInputDialog.getItem(self, title, "Select a session:", labels, 0, False)
+        if ok and choice:
+            return sessions[labels.index(choice)]
+        return None
 
-    def save_snippet(self):
-        """
-        Allow the user to select a snippet from those saved in chat,
-        then select a language from a drop-down list (which determines the file extension),
-        and finally save the chosen snippet to a file.
-        """
-        if not self.code_snippets:
-            QMessageBox.information(self, "Save Snippet", "No code snippet available to save.")
+    def open_past_session(self):
+        session = self.choose_session("Open Session")
+        if session is not None:
+            self.load_session(session["id"])
+
+    def load_session(self, session_id: int):
+        """Show a saved session, reusing its tab if open or an idle empty tab, else a new one."""
+        for conv in self.conversations:
+            if conv.session_id == session_id:
+                self.tabs.setCurrentWidget(conv.view)
+                return conv
+        store = self.get_session_store()
+        store.flush()
+        conv = self.conversation
+        if conv.chat_history or conv.task is not None:
+            conv = self.new_conversation()
+        else:
+            self.clear_chat()
+        messages = store.load_recent(session_id, self.session_page_size)
+        conv.session_id = session_id
+        conv.oldest_loaded_id = messages[0]["id"] if messages else None
+        # Snippet sources are recorded under the tab's title, so name it first.
+        title = next((s["title"] for s in store.list_sessions() if s["id"] == session_id), f"Session {session_id}")
+        self.rename_tab(conv, title)
+        conv.chat_history.extend(messages)
+        for message in messages:
+            conv.view.append_message(self.record_for_stored_message(conv, message))
+        conv.last_saved_index = len(conv.chat_history)
+        # A reopened session keeps saving new messages; other tabs follow the Save Log setting.
+        conv.save_log = True
+        conv.view.scrollToBottom()
+        self.threadpool.start(Worker(self.sentiment.backfill, store, session_id))
+        return conv
+
+    def load_older_messages(self, conv):
+        if conv.session_id is None or conv.oldest_loaded_id is None:
+            return
+        older = self.session_store.load_before(conv.session_id, conv.oldest_loaded_id, self.session_page_size)
+        if not older:
+            conv.oldest_loaded_id = None
             return
+        conv.oldest_loaded_id = older[0]["id"]
+        conv.chat_history[0:0] = older
+        conv.last_saved_index += len(older)
+        conv.context_window.reset()
+        conv.view.prepend_messages([self.record_for_stored_message(conv, message) for message in older])
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.warm_up_started:
+            self.warm_up_started = True
+            QTimer.singleShot(0, self.start_warm_up)
+
+    def start_warm_up(self):
+        worker = Worker(warm_up_modules)
+        if self.profile_startup:
+            worker.signals.result.connect(
+                lambda elapsed: print(f"  background warm-up {elapsed:.1f} ms", file=sys.stderr))
+        self.threadpool.start(worker)
+
+    def closeEvent(self, event):
+        for conv in self.conversations:
+            self.cancel_request(conv)
+        for cancel in self.export_cancels:
+            cancel.set()
+        if self.metrics_path:
+            self.write_metrics_file()
+        if self.metrics_window is not None:
+            self.metrics_window.close()
+        if self.sentiment_window is not None:
+            self.sentiment_window.close()
+        if self.snippet_window is not None:
+            self.snippet_window.close()
+        self.runner.close(client)
+        self.speech.close()
+        # Background jobs may still be using the stores closed below.
+        self.threadpool.clear()
+        self.threadpool.waitForDone(3000)
+        if self.session_store is not None:
+            self.session_store.close()
+        self.snippets.close()
+        super().closeEvent(event)
+
+    def export_messages(self, conv):
+        """The tab's whole history, reading pages of a reopened session that were never scrolled into view from the store."""
+        history = list(conv.chat_history)
+        if conv.session_id is None or conv.oldest_loaded_id is None:
+            return history, len(history)
+        store = self.get_session_store()
+        older = store.iter_messages(conv.session_id, before_id=conv.oldest_loaded_id)
+        return itertools.chain(older, history), store.count_messages(conv.session_id, conv.oldest_loaded_id) + len(history)
+
+    def start_export(self, title, job, path, total, unit="messages"):
+        """Run an export generator on the thread pool with a cancellable progress dialog (busy if ``total`` is 0)."""
+        cancel = threading.Event()
+        self.export_cancels.add(cancel)
+        dialog = QProgressDialog(f"Exporting to {os.path.basename(path)}…", "Cancel", 0, total, self)
+        dialog.setWindowTitle(title)
+        dialog.setWindowModality(Qt.WindowModality.NonModal)
+        dialog.setAutoReset(False)
+        dialog.setMinimumDuration(300)
+        dialog.canceled.connect(cancel.set)
+        worker = Worker(lambda: run_export(job, cancel, worker.signals.progress.emit))
+        worker.signals.progress.connect(dialog.setValue)
+        worker.signals.result.connect(lambda count: self.handle_export_done(title, path, count, unit))
+        worker.signals.error.connect(lambda e: QMessageBox.critical(self, title, f"Export failed: {e}"))
+        worker.signals.finished.connect(lambda: self.handle_export_finished(dialog, cancel))
+        self.threadpool.start(worker)
+
+    def handle_export_done(self, title, path, count, unit):
+        if count >= 0:
+            QMessageBox.information(self, title, f"Exported {count} {unit} to {path}")
 
-        snippet_ids = sorted(self.code_snippets.keys())
-        snippet_labels = [f"Snippet {i}" for i in snippet_ids]
+    def handle_export_finished(self, dialog, cancel):
+        self.export_cancels.discard(cancel)
+        dialog.canceled.disconnect()
+        dialog.close()
 
-        snippet_choice, ok = QInputDialog.getItem(self, "Save Snippet", "Select snippet to save:", snippet_labels, 0, False)
-        if not ok or not snippet_choice:
+    def export_chat_to_pdf(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export to PDF", "chat_history.pdf", "PDF Files (*.pdf)")
+        if path:
+            messages, total = self.export_messages(self.conversation)
+            self.start_export("Export to PDF", export_pdf(messages, path), path, total)
+
+    def export_chat_to_markdown(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export to Markdown", "chat_history.md", "Markdown Files (*.md)")
+        if path:
+            messages, total = self.export_messages(self.conversation)
+            self.start_export("Export to Markdown", export_markdown(messages, path), path, total)
+
+    def export_code_snippets(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Code Snippets", "code_snippets.txt", "Text Files (*.txt)")
+        if path:
+            snippets = [(snippet["id"], snippet["language"], snippet["code"])
+                        for snippet in map(self.snippets.get, sorted(self.snippet_records)) if snippet is not None]
+            self.start_export("Export Code Snippets", export_snippets(snippets, path), path, len(snippets), "snippets")
+
+    def export_saved_session(self):
+        """Export a saved session straight from the session store without opening it in a tab."""
+        session = self.choose_session("Export Saved Session")
+        if session is None:
+            return
+        formats = ["Markdown (.md)", "PDF (.pdf)", "Code Snippets (.txt)"]
+        choice, ok = QInputDialog.getItem(self, "Export Saved Session", "Export as:", formats, 0, False)
+        if not ok or not choice:
+            return
+        extension = choice[choice.index("(.") + 2:-1]
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Saved Session", f"session_{session['id']}.{extension}",
+            f"{choice.split(' (')[0]} Files (*.{extension})")
+        if not path:
             return
+        store = self.get_session_store()
+        store.flush()
+        messages = store.iter_messages(session["id"])
+        if extension == "pdf":
+            self.start_export("Export Saved Session", export_pdf(messages, path), path, session["message_count"])
+        elif extension == "md":
+            self.start_export("Export Saved Session", export_markdown(messages, path), path, session["message_count"])
+        else:
+            self.start_export("Export Saved Session", export_snippets(snippets_in(messages), path), path, 0, "snippets")
 
-        chosen_id = snippet_ids[snippet_labels.index(snippet_choice)]
-        code_text = self.code_snippets.get(chosen_id, "")
-        if not code_text:
-            QMessageBox.warning(self, "Save Snippet", "Selected snippet not found.")
+    def save_snippet(self):
+        """Pick one of the open chats' snippets and save it, with the extension taken from its language."""
+        snippets = [snippet for snippet in map(self.snippets.get, sorted(self.snippet_records)) if snippet is not None]
+        if not snippets:
+            QMessageBox.information(self, "Save Snippet", "No code snippet available to save.")
             return
+        labels = [self.snippet_label(snippet) for snippet in snippets]
+        choice, ok = QInputDialog.getItem(self, "Save Snippet", "Select snippet to save:", labels, 0, False)
+        if ok and choice:
+            self.save_snippet_to_file(snippets[labels.index(choice)])
+
+    def snippet_label(self, snippet) -> str:
+        first_line = next((line.strip() for line in snippet["code"].splitlines() if line.strip()), "")
+        return f"Snippet {snippet['id']} ({snippet['language'] or 'unknown'}) — {first_line[:50]}"
 
-        languages = {
-            "Python (.py)": "py",
-            "JavaScript (.js)": "js",
-            "C++ (.cpp)": "cpp",
-            "Java (.java)": "java",
-            "Text (.txt)": "txt"
-        }
-        lang_items = list(languages.keys())
-        lang_choice, ok = QInputDialog.getItem(self, "Save Snippet", "Select language:", lang_items, 0, False)
-        if not ok or not lang_choice:
+    def save_snippet_to_file(self, snippet):
+        if snippet["language"]:
+            self.save_snippet_as(snippet, snippet["language"])
             return
+        # Detecting the language can take a while on long code, so it runs on the thread pool.
+        worker = Worker(detect_language, snippet["code"])
+        worker.signals.result.connect(lambda language: self.save_snippet_as(snippet, language))
+        worker.signals.error.connect(self.handle_worker_error)
+        self.threadpool.start(worker)
 
-        ext = languages.get(lang_choice, "txt")
-        file_name = f"snippet_{chosen_id}.{ext}"
+    def save_snippet_as(self, snippet, language):
+        if language and not snippet["language"]:
+            self.snippets.set_language(snippet["id"], language)
+        extension = extension_for(language)
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Save Snippet", f"snippet_{snippet['id']}.{extension}",
+            f"{(language or 'Text').capitalize()} Files (*.{extension});;All Files (*)")
+        if not path:
+            return
         try:
-            with open(file_name, "w", encoding="utf-8") as file:
-                file.write(code_text)
-            QMessageBox.information(self, "Save Snippet", f"Snippet saved as {file_name}")
+            with open(path, "w", encoding="utf-8") as file:
+                file.write(snippet["code"])
+            QMessageBox.information(self, "Save Snippet", f"Snippet saved as {path}")
         except Exception as e:
             QMessageBox.critical(self, "Save Snippet", f"Failed to save snippet: {e}")
 
+    def show_snippet_browser(self):
+        """Every snippet seen in any chat or session, searchable by code or language."""
+        if self.snippet_window is None:
+            window = QWidget()
+            window.setWindowTitle("Code Snippets")
+            layout = QVBoxLayout(window)
+            self.snippet_filter = QLineEdit()
+            self.snippet_filter.setPlaceholderText("Search code or language…")
+            self.snippet_filter.textChanged.connect(self.refresh_snippet_browser)
+            layout.addWidget(self.snippet_filter)
+            self.snippet_list = QListWidget()
+            self.snippet_list.currentItemChanged.connect(self.preview_snippet)
+            layout.addWidget(self.snippet_list)
+            self.snippet_preview = QTextBrowser()
+            layout.addWidget(self.snippet_preview)
+            buttons = QHBoxLayout()
+            save_button = QPushButton("💾 Save")
+            save_button.clicked.connect(lambda: self.save_selected_snippet())
+            buttons.addWidget(save_button)
+            copy_button = QPushButton("📋 Copy")
+            copy_button.clicked.connect(lambda: self.save_selected_snippet(copy=True))
+            buttons.addWidget(copy_button)
+            layout.addLayout(buttons)
+            window.resize(600, 600)
+            self.snippet_window = window
+        self.refresh_snippet_browser()
+        self.snippet_window.show()
+        self.snippet_window.raise_()
+
+    def refresh_snippet_browser(self):
+        try:
+            found = self.snippets.search(self.snippet_filter.text().strip())
+        except Exception as e:
+            QMessageBox.warning(self, "Code Snippets", f"Snippets could not be searched: {e}")
+            return
+        self.snippet_list.clear()
+        for snippet in found:
+            source = f" · {snippet['title'][:30]}" if snippet["title"] else ""
+            item = QListWidgetItem(f"{self.snippet_label(snippet)}{source} · seen {snippet['sources']}×")
+            item.setData(Qt.ItemDataRole.UserRole, snippet["id"])
+            self.snippet_list.addItem(item)
+        if found:
+            self.snippet_list.setCurrentRow(0)
+        else:
+            self.snippet_preview.setHtml("<p>No snippets found.</p>")
+
+    def preview_snippet(self, item, _previous=None):
+        if item is None:
+            return
+        snippet = self.snippets.get(item.data(Qt.ItemDataRole.UserRole))
+        if snippet is None:
+            return
+        sources = []
+        for source in self.snippets.sources(snippet["id"])[:10]:
+            where = f"session #{source['session_id']}" if source["session_id"] is not None else "unsaved chat"
+            when = time.strftime("%Y-%m-%d %H:%M", time.localtime(source["created"]))
+            sources.append(html.escape(f"{source['title'] or 'Untitled'} ({where}, {source['role']}, {when})"))
+        code = snippet["code"]
+        if can_highlight_inline(code, snippet["language"]):
+            code = highlight_code(code, snippet["language"])
+        else:
+            code = plain_code(code)
+        self.snippet_preview.setHtml(
+            f"<p style='color: #888888;'>From: {'<br>'.join(sources)}</p>"
+            f"<pre style='background-color: black; color: white; padding: 10px;'>{code}</pre>")
+
+    def save_selected_snippet(self, copy=False):
+        item = self.snippet_list.currentItem()
+        snippet = self.snippets.get(item.data(Qt.ItemDataRole.UserRole)) if item is not None else None
+        if snippet is None:
+            return
+        if copy:
+            QApplication.clipboard().setText(snippet["code"])
+        else:
+            self.save_snippet_to_file(snippet)
+
     def speech_to_text_placeholder(self):
         QMessageBox.information(self, "Speech-to-Text", "Speech-to-Text feature coming soon!")
 
     def speak_last_ai_message(self):
-        for msg in reversed(self.chat_history):
+        for msg in reversed(self.conversation.chat_history):
             if msg["role"] == "assistant":
-                self.tts_engine.say(msg["content"])
-                self.tts_engine.runAndWait()
+                self.speech.stop()
+                self.spoken_record = None
+                self.speech.speak(msg["content"])
                 return
         QMessageBox.information(self, "Text-to-Speech", "No AI message to speak.")
 
+    def stop_speech(self):
+        self.spoken_record = None
+        self.speech.stop()
+
+    def toggle_speech_pause(self):
+        if self.speech.paused:
+            self.speech.resume()
+        else:
+            self.speech.pause()
+
+    def toggle_auto_speak(self):
+        self.auto_speak = not self.auto_speak
+        if not self.auto_speak:
+            self.stop_speech()
+        state = "ON" if self.auto_speak else "OFF"
+        QMessageBox.information(self, "Auto-Speak", f"Speaking new AI replies is now {state}.")
+
+    def handle_speech_error(self, error: Exception):
+        self.spoken_record = None
+        QMessageBox.critical(self, "Text-to-Speech", f"Text-to-speech is unavailable: {error}")
+
     def search_chat_history(self):
-        keyword, ok = QInputDialog.getText(self, "Search Chat History", "Enter keyword:")
-        if ok and keyword:
-            results = []
-            for msg in self.chat_history:
-                if keyword.lower() in msg["content"].lower():
-                    results.append(f"{msg['role'].capitalize()}: {msg['content']}")
-            result_text = "\n\n".join(results) if results else "No matches found."
+        query, ok = QInputDialog.getText(
+            self, "Search Chat History", 'Enter keywords ("exact phrase", role:user or role:ai to filter):')
+        if not ok or not query.strip():
+            return
+        terms, phrases, role = parse_search_query(query)
+        started = time.perf_counter()
+        local_hits = []
+        exclude = []
+        for conv in self.conversations:
+            local_hits += [conv.indexed_records[key] for key in conv.search_index.search(terms, phrases, role)]
+            if conv.session_id is not None:
+                exclude.append((conv.session_id, conv.oldest_loaded_id or 0))
+        try:
+            stored_hits = self.get_session_store().search(terms, phrases, role, exclude=exclude)
+        except Exception as e:
+            stored_hits = []
+            QMessageBox.warning(self, "Search Chat History", f"Saved sessions could not be searched: {e}")
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        parts = [f"<p style='color: #888888;'>{len(local_hits) + len(stored_hits)} results in {elapsed_ms:.1f} ms</p>"]
+        if local_hits:
+            parts.append("<h3>Open chats</h3>")
+        for record in local_hits:
+            excerpt = highlight_excerpt(record.text, terms, phrases)
+            parts.append(f"<p><a href='local:{record.id}'>{html.escape(record.sender)}</a>: {excerpt}</p>")
+        if stored_hits:
+            parts.append("<h3>Saved sessions</h3>")
+        for hit in stored_hits:
+            excerpt = highlight_excerpt(hit["content"], terms, phrases)
+            label = html.escape(f"#{hit['session_id']} {hit['title'][:40]} — {hit['role'].capitalize()}")
+            parts.append(f"<p><a href='stored:{hit['session_id']}:{hit['id']}'>{label}</a>: {excerpt}</p>")
+        if not local_hits and not stored_hits:
+            parts.append("<p>No matches found.</p>")
+
+        if self.results_window is None:
             results_window = QWidget()
             results_window.setWindowTitle("Search Results")
             layout = QVBoxLayout(results_window)
-            results_text_edit = QTextEdit()
-            results_text_edit.setReadOnly(True)
-            results_text_edit.setText(result_text)
-            layout.addWidget(results_text_edit)
-            results_window.resize(400, 300)
-            results_window.show()
+            self.results_browser = QTextBrowser()
+            self.results_browser.setOpenLinks(False)
+            self.results_browser.anchorClicked.connect(self.jump_to_search_hit)
+            layout.addWidget(self.results_browser)
+            results_window.resize(500, 400)
             self.results_window = results_window
+        self.results_browser.setHtml("".join(parts))
+        self.results_window.show()
+        self.results_window.raise_()
+
+    def jump_to_search_hit(self, url: QUrl):
+        kind, _, target = url.toString().partition(":")
+        if kind == "local":
+            conv = next((c for c in self.conversations if int(target) in c.indexed_records), None)
+            if conv is None:
+                return
+            record = conv.indexed_records[int(target)]
+            self.tabs.setCurrentWidget(conv.view)
+        else:
+            session_id, message_id = (int(part) for part in target.split(":"))
+            conv = self.load_session(session_id)
+            while conv.oldest_loaded_id is not None and message_id < conv.oldest_loaded_id:
+                self.load_older_messages(conv)
+            record = next((r for r in conv.view.message_model.records if r.message_id == message_id), None)
+        if record is not None:
+            conv.view.scroll_to_record(record)
+            self.activateWindow()
+
+    def score_new_messages(self):
+        """Score messages that have no sentiment yet on the thread pool, a batch at a time."""
+        if self.sentiment_busy:
+            return
+        messages = [m for conv in self.conversations for m in conv.chat_history if m.get("polarity") is None]
+        if not messages:
+            return
+        self.sentiment_busy = True
+        worker = Worker(self.sentiment.score_batch, [m["content"] for m in messages])
+        worker.signals.result.connect(lambda scores: self.apply_sentiment(messages, scores))
+        worker.signals.error.connect(lambda e: setattr(self, "sentiment_busy", False))
+        self.threadpool.start(worker)
+
+    def apply_sentiment(self, messages, scores):
+        self.sentiment_busy = False
+        for message, (polarity, subjectivity) in zip(messages, scores):
+            message["polarity"] = polarity
+            message["subjectivity"] = subjectivity
+        self.store_sentiment(messages)
+        if any(m.get("polarity") is None for conv in self.conversations for m in conv.chat_history):
+            self.sentiment_timer.start()
+
+    def store_sentiment(self, messages):
+        """Persist the scores of messages that are already saved, so ``backfill`` never scores them again."""
+        rows = [(m["polarity"], m["subjectivity"], m["id"])
+                for m in messages if m.get("id") is not None and m.get("polarity") is not None]
+        if rows and self.session_store is not None:
+            self.threadpool.start(Worker(self.session_store.set_sentiment, rows))
 
     def show_last_ai_sentiment(self):
-        for msg in reversed(self.chat_history):
+        for msg in reversed(self.conversation.chat_history):
             if msg["role"] == "assistant":
-                blob = TextBlob(msg["content"])
-                polarity = blob.sentiment.polarity
-                sentiment = "Positive" if polarity > 0 else "Negative" if polarity < 0 else "Neutral"
-                summary = f"Sentiment: {sentiment} (Polarity: {polarity:.2f})"
-                QMessageBox.information(self, "AI Message Sentiment", summary)
+                if msg.get("polarity") is None:
+                    worker = Worker(self.sentiment.score_batch, [msg["content"]])
+                    worker.signals.result.connect(lambda scores, msg=msg: self.report_sentiment(msg, *scores[0]))
+                    worker.signals.error.connect(self.handle_worker_error)
+                    self.threadpool.start(worker)
+                else:
+                    self.report_sentiment(msg, msg["polarity"], msg["subjectivity"])
                 return
         QMessageBox.information(self, "AI Message Sentiment", "No AI message to analyze.")
 
+    def report_sentiment(self, msg, polarity, subjectivity):
+        msg["polarity"], msg["subjectivity"] = polarity, subjectivity
+        self.store_sentiment([msg])
+        summary = f"Sentiment: {sentiment_label(polarity)} (Polarity: {polarity:.2f}, Subjectivity: {subjectivity:.2f})"
+        QMessageBox.information(self, "AI Message Sentiment", summary)
+
+    def sentiment_series(self, session_id, unsaved):
+        """Runs on the thread pool: ``(role, polarity)`` for a saved session plus messages not saved yet."""
+        series = []
+        if session_id is not None:
+            self.session_store.flush()
+            self.sentiment.backfill(self.session_store, session_id)
+            series = [(role, polarity) for role, _, polarity in self.session_store.sentiment_series(session_id)]
+        scores = self.sentiment.score_batch([content for _, content in unsaved])
+        return series + [(role, polarity) for (role, _), (polarity, _) in zip(unsaved, scores)]
+
+    def show_conversation_sentiment(self):
+        conv = self.conversation
+        saved = conv.last_saved_index if conv.session_id is not None else 0
+        unsaved = [(m["role"], m["content"]) for m in conv.chat_history[saved:]]
+        self.start_sentiment_view(conv.title, conv.session_id, unsaved)
+
+    def show_saved_session_sentiment(self):
+        session = self.choose_session("Saved Session Sentiment")
+        if session is not None:
+            self.start_sentiment_view(session["title"], session["id"], [])
+
+    def start_sentiment_view(self, title, session_id, unsaved):
+        worker = Worker(self.sentiment_series, session_id, unsaved)
+        worker.signals.result.connect(lambda series: self.show_sentiment_chart(title, series))
+        worker.signals.error.connect(self.handle_worker_error)
+        self.threadpool.start(worker)
+
+    def show_sentiment_chart(self, title, series):
+        if not series:
+            QMessageBox.information(self, "Conversation Sentiment", "No messages to analyze.")
+            return
+        lines = []
+        for role, name in (("user", "You"), ("assistant", "AI Assistant")):
+            values = [polarity for r, polarity in series if r == role and polarity is not None]
+            if values:
+                mean = sum(values) / len(values)
+                positive = sum(v > 0 for v in values) * 100 // len(values)
+                negative = sum(v < 0 for v in values) * 100 // len(values)
+                lines.append(f"{name}: {len(values)} messages, mean polarity {mean:+.2f} ({sentiment_label(mean)}), "
+                             f"{positive}% positive, {negative}% negative")
+        if self.sentiment_window is not None:
+            self.sentiment_window.close()
+        window = QWidget()
+        window.setWindowTitle(f"Sentiment — {title[:40]}")
+        layout = QVBoxLayout(window)
+        summary = QLabel("\n".join(lines))
+        layout.addWidget(summary)
+        layout.addWidget(SentimentChart(series, {"user": self.user_label_color, "assistant": self.ai_label_color}))
+        window.resize(640, 320)
+        window.show()
+        self.sentiment_window = window
+
     def clear_chat(self):
-        self.chat_history.clear()
-        self.chat_display.clear()
-        self.last_saved_index = 0
+        conv = self.conversation
+        self.forget_snippets(conv)
+        conv.reset()
+        conv.save_log = self.save_log
+        self.rename_tab(conv, "New Chat")
 
     def update_style(self):
         self.setStyleSheet(f"background-color: {self.bg_color};")
-        self.chat_display.setStyleSheet(f"background-color: {self.bg_color}; color: white; font-size: 14px;")
+        for conv in self.conversations:
+            conv.view.setStyleSheet(f"background-color: {self.bg_color}; color: white; font-size: 14px;")
 
     def change_ai_reply_font(self):
         font, ok = QFontDialog.getFont(self.ai_reply_font, self, "Choose AI Reply Font")
         if ok:
             self.ai_reply_font = font
+            for conv in self.conversations:
+                conv.view.rerender()
             QMessageBox.information(self, "AI Reply Formatting", "AI reply font updated.")
 
 if __name__ == "__main__":
+    profile_startup = "--profile-startup" in sys.argv or os.environ.get("GROQ_AI_PROFILE_STARTUP", "") not in ("", "0")
+    imported = time.perf_counter()
     app = QApplication(sys.argv)
-    window = AIChatApp()
+    window = AIChatApp(profile_startup=profile_startup)
+    constructed = time.perf_counter()
     window.show()
+    if profile_startup:
+        QTimer.singleShot(0, lambda: print_startup_report([
+            ("imports", imported - STARTUP_STARTED),
+            ("construction", constructed - imported),
+            ("first show", time.perf_counter() - constructed),
+        ]))
     sys.exit(app.exec())
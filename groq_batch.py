@@ -0,0 +1,191 @@
+"""
+Headless batch mode: run a JSONL file of prompts through one or more models.
+
+Each input line is either a JSON object with a ``prompt`` (or a full ``messages`` list)
+and optional ``id``, ``system`` and ``models`` keys, or a bare JSON string. One result
+line is written per (prompt, model) pair, in completion order.
+
+    python groq_batch.py prompts.jsonl -m llama3-8b-8192 -m "🚀 Llama3 70B" -c 8 --rate 2
+
+This module never imports Qt, pyttsx3 or fpdf so it starts quickly on servers.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+import time
+
+from async_client import create_async_client
+from chat_models import MODEL_MAPPING
+from context_window import ContextWindow
+from highlighting import extract_code_snippets
+from request_scheduler import RequestScheduler
+from telemetry import Telemetry
+
+
+class TokenBucket:
+    """Allows ``rate`` requests per second on average with bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def resolve_model(name: str) -> str:
+    return MODEL_MAPPING.get(name, name)
+
+
+def parse_job(line: str, index: int, default_system: str):
+    """``(id, messages, system, models)`` for one input line; raises ValueError if the line isn't a valid job."""
+    item = json.loads(line)
+    if isinstance(item, str):
+        item = {"prompt": item}
+    if not isinstance(item, dict):
+        raise ValueError("expected a JSON object or string")
+    messages = item.get("messages")
+    if messages is None:
+        if not isinstance(item.get("prompt"), str):
+            raise ValueError('"prompt" must be a string')
+        messages = [{"role": "user", "content": item["prompt"]}]
+    elif not isinstance(messages, list) or not all(
+            isinstance(m, dict) and isinstance(m.get("role"), str) and isinstance(m.get("content"), str)
+            for m in messages):
+        raise ValueError('"messages" must be a list of objects with string "role" and "content"')
+    system = item.get("system", default_system)
+    if system is not None and not isinstance(system, str):
+        raise ValueError('"system" must be a string')
+    models = item.get("models")
+    if models is not None and (not isinstance(models, list) or not all(isinstance(m, str) for m in models)):
+        raise ValueError('"models" must be a list of strings')
+    return item.get("id", index), messages, system, models
+
+
+async def run_job(scheduler, job_id, model, messages, system, args) -> dict:
+    result = {"id": job_id, "model": model}
+    usage, stats = {}, {}
+    started = time.perf_counter()
+    try:
+        request = ContextWindow().build(messages, model, system)
+        content = await scheduler.request(model, request, usage=usage, stats=stats)
+    except Exception as e:
+        # One bad job is reported in its result instead of stopping the batch.
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+    else:
+        result.update(ok=True, response=content)
+        if usage:
+            result["usage"] = {**usage, "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"]}
+        if args.extract_code:
+            result["snippets"] = [
+                {"language": language, "code": code} for language, code in extract_code_snippets(content)
+            ]
+    result["attempts"] = stats.get("attempts", args.retries + 1)
+    if stats.get("shared"):
+        result["shared"] = True
+    result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+async def run_batch(args, source, sink) -> int:
+    client = create_async_client(
+        api_key=args.api_key, base_url=args.base_url, max_connections=args.concurrency, max_retries=0)
+    bucket = TokenBucket(args.rate, args.burst) if args.rate else None
+    telemetry = Telemetry(window=1_000_000) if args.metrics else None
+    scheduler = RequestScheduler(
+        lambda: client, retries=args.retries, backoff=args.backoff, limiter=bucket, telemetry=telemetry)
+    models = [resolve_model(name) for name in args.model]
+    jobs = asyncio.Queue(maxsize=args.concurrency * 2)
+    failures = 0
+
+    async def produce():
+        loop = asyncio.get_running_loop()
+        # Indexes count physical lines, blank ones included, so messages and default ids match the file.
+        for index in itertools.count():
+            line = await loop.run_in_executor(None, source.readline)
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                job_id, messages, system, job_models = parse_job(line, index, args.system)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping line {index + 1}: {e}", file=sys.stderr)
+                continue
+            for model in job_models or models:
+                await jobs.put((job_id, resolve_model(model), messages, system))
+        for _ in range(args.concurrency):
+            await jobs.put(None)
+
+    async def consume():
+        nonlocal failures
+        while True:
+            job = await jobs.get()
+            if job is None:
+                return
+            result = await run_job(scheduler, *job, args)
+            failures += not result["ok"]
+            sink.write(json.dumps(result, ensure_ascii=False) + "\n")
+            sink.flush()
+
+    try:
+        await asyncio.gather(produce(), *(consume() for _ in range(args.concurrency)))
+    finally:
+        await client.close()
+        if telemetry is not None:
+            telemetry.write(args.metrics)
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL prompt file through Groq models without the GUI.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL prompt file, or - for stdin")
+    parser.add_argument("-m", "--model", action="append",
+                        help="model id or display name from the app; repeat to fan out (default: llama3-8b-8192)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file, or - for stdout")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--rate", type=float, default=0, help="max requests per second (0 = unlimited)")
+    parser.add_argument("--burst", type=float, default=None, help="token bucket size (default: rate)")
+    parser.add_argument("--retries", type=int, default=3, help="retries for rate limits and transient errors")
+    parser.add_argument("--backoff", type=float, default=0.5, help="base backoff in seconds")
+    parser.add_argument("--system", default="", help="custom prompt sent as the system message")
+    parser.add_argument("--extract-code", action="store_true", help="add fenced code snippets to each result")
+    parser.add_argument("--metrics", help="write per-model latency metrics here (Prometheus text, or JSONL for .jsonl)")
+    parser.add_argument("--api-key", default=os.environ.get("GROQ_API_KEY"))
+    parser.add_argument("--base-url", default=None)
+    args = parser.parse_args(argv)
+    args.model = args.model or ["llama3-8b-8192"]
+    args.concurrency = max(args.concurrency, 1)
+    return args
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        failures = asyncio.run(run_batch(args, source, sink))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import hashlib
+import html
+import re
+import threading
+from collections import OrderedDict
+
+from markdown_render import fenced_code_blocks
+
+CODE_INDICATORS = ["def ", "elif ", "{", "}", ";"]
+INLINE_HIGHLIGHT_LIMIT = 4000
+# Pygments' own guessing rarely recognises short snippets, so common languages are spotted first.
+LANGUAGE_HINTS = {
+    language: re.compile(pattern, re.MULTILINE) for language, pattern in {
+        "python": r"^\s*(def \w+\(.*\):|class \w+.*:|import \w+|from [\w.]+ import |elif |print\()",
+        "javascript": r"\b(const|let) \w+ =|\bfunction\s*\w*\(|console\.log|=> \{",
+        "java": r"\bpublic (static )?(class|void|int)|System\.out\.",
+        "cpp": r"#include\s*<\w+>|\bstd::|\bcout\s*<<",
+        "go": r"^package \w+|^func \w+\(|:= ",
+        "rust": r"\bfn \w+\(|\blet mut |println!",
+        "bash": r"^#!/bin/(ba)?sh|^\s*(echo|sudo|apt(-get)?|pip|npm|cd|export) ",
+        "sql": r"(?i)^\s*(select .+ from|insert into|create table|update \w+ set)\b",
+        "html": r"</?(html|head|body|div|span|p|a|script)\b[^>]*>",
+    }.items()
+}
+
+_formatter = None
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_size = 512
+
+
+def extract_code_snippets(text: str) -> list:
+    """Return ``(language, code)`` for each fenced block, or the whole text if it merely looks like code."""
+    blocks = fenced_code_blocks(text)
+    if not blocks and len(text.splitlines()) >= 3:
+        score = sum(1 for indicator in CODE_INDICATORS if indicator in text)
+        if score >= 2:
+            blocks = [(None, text)]
+    return blocks
+
+
+def cache_key(code: str, language=None) -> str:
+    digest = hashlib.sha1(code.encode("utf-8")).hexdigest()
+    return f"{language or ''}:{digest}"
+
+
+def get_formatter():
+    global _formatter
+    if _formatter is None:
+        from pygments.formatters import HtmlFormatter
+
+        _formatter = HtmlFormatter(nowrap=True, noclasses=True, style='monokai')
+    return _formatter
+
+
+def lexer_for_language(language):
+    if not language:
+        return None
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+
+    try:
+        return get_lexer_by_name(language.lower())
+    except ClassNotFound:
+        return None
+
+
+def detect_language(code: str):
+    """Best guess at the language of unfenced code, as a Pygments alias, or None."""
+    scores = {language: len(pattern.findall(code)) for language, pattern in LANGUAGE_HINTS.items()}
+    best = max(scores, key=scores.get)
+    if scores[best]:
+        return best
+    from pygments.lexers import guess_lexer
+    from pygments.util import ClassNotFound
+
+    try:
+        lexer = guess_lexer(code)
+    except ClassNotFound:
+        return None
+    return lexer.aliases[0] if lexer.aliases and lexer.aliases[0] != "text" else None
+
+
+def extension_for(language) -> str:
+    """File extension for a language name, from the lexer's own filename patterns."""
+    lexer = lexer_for_language(language)
+    for pattern in getattr(lexer, "filenames", ()):
+        extension = pattern.rpartition("*.")[2]
+        if pattern.startswith("*.") and extension.isalnum():
+            return extension
+    return "txt"
+
+
+def cached_highlight(code: str, language=None):
+    key = cache_key(code, language)
+    with _cache_lock:
+        highlighted = _cache.get(key)
+        if highlighted is not None:
+            _cache.move_to_end(key)
+        return highlighted
+
+
+def highlight_code(code: str, language=None) -> str:
+    """Highlight code with the fenced language's lexer, or with the one ``detect_language`` picks."""
+    return highlight_snippet(code, language)[1]
+
+
+def highlight_snippet(code: str, language=None):
+    """
+    ``(language, html)``: the fenced language, or the detected one when there is none, and
+    the highlighted code. Detection can be slow, so this belongs on a worker thread.
+    """
+    highlighted = cached_highlight(code, language)
+    if highlighted is not None and language:
+        return language, highlighted
+    detected = language or detect_language(code)
+    if highlighted is None:
+        from pygments import highlight
+
+        lexer = lexer_for_language(detected) or lexer_for_language("text")
+        highlighted = highlight(code, lexer, get_formatter())
+        with _cache_lock:
+            _cache[cache_key(code, language)] = highlighted
+            while len(_cache) > _cache_size:
+                _cache.popitem(last=False)
+    return detected, highlighted
+
+
+def clear_highlight_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def can_highlight_inline(code: str, language=None) -> bool:
+    return len(code) <= INLINE_HIGHLIGHT_LIMIT and lexer_for_language(language) is not None
+
+
+def plain_code(code: str) -> str:
+    return html.escape(code)
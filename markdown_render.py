@@ -0,0 +1,264 @@
+"""
+Single-pass, incremental Markdown to HTML for chat replies.
+
+``MarkdownRenderer`` is a line-oriented state machine covering paragraphs, headings,
+ordered and unordered (nested) lists, fenced code blocks, tables, horizontal rules and
+inline code, bold, italic and links. Text can be fed in arbitrary deltas: each call to
+``feed`` returns only the HTML of blocks that became final, so the work done grows with
+the new text rather than the whole message. Everything taken from the text is escaped.
+"""
+import html
+import re
+
+FENCE = re.compile(r"^(\s*)(`{3,}|~{3,})\s*([\w+#.-]*)[^`]*$")
+HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+LIST_ITEM = re.compile(r"^(\s*)(?:([-*+])|(\d{1,9})[.)])\s+(.*)$")
+RULE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+TABLE_DELIMITER = re.compile(r"^\s*\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?\s*$")
+INLINE = re.compile(
+    r"(?P<ticks>`+)(?P<code>.+?)(?P=ticks)"
+    r"|\*\*(?P<bold>\S(?:.*?\S)?)\*\*"
+    r"|\*(?P<italic>[^\s*](?:[^*]*[^\s*])?)\*"
+    r"|\[(?P<label>[^\]]+)\]\((?P<url>https?://[^)\s]+)\)"
+)
+
+
+def render_inline(text: str) -> str:
+    parts = []
+    position = 0
+    for match in INLINE.finditer(text):
+        parts.append(html.escape(text[position:match.start()]))
+        if match.group("ticks"):
+            parts.append(f"<code>{html.escape(match.group('code').strip() or match.group('code'))}</code>")
+        elif match.group("bold") is not None:
+            parts.append(f"<b>{render_inline(match.group('bold'))}</b>")
+        elif match.group("italic") is not None:
+            parts.append(f"<i>{render_inline(match.group('italic'))}</i>")
+        else:
+            parts.append(f"<a href=\"{html.escape(match.group('url'))}\">{render_inline(match.group('label'))}</a>")
+        position = match.end()
+    parts.append(html.escape(text[position:]))
+    return "".join(parts)
+
+
+def closes_fence(line: str, marker: str) -> bool:
+    stripped = line.strip()
+    return stripped.startswith(marker) and not stripped.strip(marker[0])
+
+
+def plain_code_block(code: str, language) -> str:
+    return f"<pre>{html.escape(code)}</pre>"
+
+
+def _cells(line: str) -> list:
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|") and not line.endswith("\\|"):
+        line = line[:-1]
+    return [cell.strip().replace("\\|", "|") for cell in re.split(r"(?<!\\)\|", line)]
+
+
+class MarkdownRenderer:
+    """
+    Feed text with ``feed``, then call ``finish`` once. ``code_block(code, language)``
+    renders each fenced block (escaped ``<pre>`` by default); ``code_blocks`` counts them.
+    ``html[:closed]`` holds only closed top-level blocks; after it a list or table may still be open.
+    """
+
+    def __init__(self, code_block=plain_code_block):
+        self.code_block = code_block
+        self.code_blocks = 0
+        self.buffer = ""
+        self.paragraph = []
+        self.lists = []
+        self.item = None
+        self.fence = None
+        self.table = None
+        self.html = ""
+        self.closed = 0
+
+    def feed(self, delta: str) -> str:
+        """Add text and return the HTML of whatever it completed."""
+        self.buffer += delta
+        end = self.buffer.rfind("\n")
+        if end < 0:
+            return ""
+        lines, self.buffer = self.buffer[:end].split("\n"), self.buffer[end + 1:]
+        out = []
+        for line in lines:
+            self._line(line.rstrip("\r"), out)
+        return self._emit(out)
+
+    def finish(self) -> str:
+        """Render what is left, closing any open block."""
+        out = []
+        if self.buffer:
+            self._line(self.buffer, out)
+            self.buffer = ""
+        if self.fence is not None:
+            self._close_fence(out)
+        self._close_blocks(out)
+        return self._emit(out)
+
+    def pending(self) -> str:
+        """Text that has been fed but not rendered yet, e.g. to show as plain text while streaming."""
+        lines = list(self.paragraph)
+        if self.item is not None:
+            lines += self.item
+        if self.fence is not None:
+            lines += [self.fence[0]] + self.fence[4]
+        return "\n".join(lines + [self.buffer]) if lines else self.buffer
+
+    def _emit(self, out) -> str:
+        rendered = "".join(out)
+        self.html += rendered
+        if not self.lists and self.table is None:
+            self.closed = len(self.html)
+        return rendered
+
+    def _line(self, line, out):
+        if self.fence is not None:
+            _, indent, marker, _, lines = self.fence
+            if closes_fence(line, marker):
+                self._close_fence(out)
+            else:
+                lines.append(line[min(indent, len(line) - len(line.lstrip())):])
+            return
+        fence = FENCE.match(line)
+        if fence:
+            self._close_paragraph(out)
+            self._close_table(out)
+            self._flush_item(out)
+            self.fence = (line, len(fence.group(1)), fence.group(2), fence.group(3) or None, [])
+            return
+        if not line.strip():
+            self._close_blocks(out)
+            return
+        if self.table is not None:
+            if "|" in line:
+                out.append(self._row(line, "td"))
+                return
+            self._close_table(out)
+        heading = HEADING.match(line)
+        if heading:
+            self._close_blocks(out)
+            level = len(heading.group(1))
+            out.append(f"<h{level}>{render_inline(heading.group(2))}</h{level}>")
+            return
+        if RULE.match(line):
+            self._close_blocks(out)
+            out.append("<hr>")
+            return
+        item = LIST_ITEM.match(line)
+        if item:
+            self._close_paragraph(out)
+            self._list_item(len(item.group(1).expandtabs(4)), item.group(3), item.group(4), out)
+            return
+        if self.item is not None:
+            self.item.append(line.strip())
+            return
+        if self.lists:
+            self._close_lists(out)
+        if self.paragraph and "|" in self.paragraph[-1] and TABLE_DELIMITER.match(line):
+            header = self.paragraph.pop()
+            self._close_paragraph(out)
+            self._open_table(header, line, out)
+            return
+        self.paragraph.append(line)
+
+    def _close_blocks(self, out):
+        self._close_paragraph(out)
+        self._close_table(out)
+        self._close_lists(out)
+
+    def _close_paragraph(self, out):
+        if self.paragraph:
+            out.append(f"<p>{'<br>'.join(render_inline(line.strip()) for line in self.paragraph)}</p>")
+            self.paragraph = []
+
+    def _close_fence(self, out):
+        _, _, _, language, lines = self.fence
+        self.fence = None
+        self.code_blocks += 1
+        out.append(self.code_block("".join(line + "\n" for line in lines), language))
+
+    def _list_item(self, indent, number, text, out):
+        tag = "ol" if number is not None else "ul"
+        self._flush_item(out)
+        while self.lists and self.lists[-1][0] > indent:
+            out.append(f"</li></{self.lists.pop()[1]}>")
+        if self.lists and self.lists[-1][0] == indent and self.lists[-1][1] == tag:
+            out.append("</li>")
+        else:
+            if self.lists and self.lists[-1][0] == indent:
+                out.append(f"</li></{self.lists.pop()[1]}>")
+            start = f' start="{int(number)}"' if number is not None and int(number) != 1 else ""
+            out.append(f"<{tag}{start}>")
+            self.lists.append((indent, tag))
+        out.append("<li>")
+        self.item = [text]
+
+    def _flush_item(self, out):
+        if self.item is not None:
+            out.append("<br>".join(render_inline(line) for line in self.item))
+            self.item = None
+
+    def _close_lists(self, out):
+        self._flush_item(out)
+        while self.lists:
+            out.append(f"</li></{self.lists.pop()[1]}>")
+
+    def _open_table(self, header, delimiter, out):
+        self.table = []
+        for cell in _cells(delimiter):
+            if cell.startswith(":") and cell.endswith(":"):
+                self.table.append("center")
+            elif cell.endswith(":"):
+                self.table.append("right")
+            else:
+                self.table.append(None)
+        out.append("<table border=\"1\" cellspacing=\"0\" cellpadding=\"4\">")
+        out.append(self._row(header, "th"))
+
+    def _row(self, line, tag) -> str:
+        cells = _cells(line)
+        cells = (cells + [""] * len(self.table))[:len(self.table)]
+        rendered = []
+        for cell, align in zip(cells, self.table):
+            attribute = f' align="{align}"' if align else ""
+            rendered.append(f"<{tag}{attribute}>{render_inline(cell)}</{tag}>")
+        return f"<tr>{''.join(rendered)}</tr>"
+
+    def _close_table(self, out):
+        if self.table is not None:
+            out.append("</table>")
+            self.table = None
+
+
+def render_markdown(text: str, code_block=plain_code_block) -> str:
+    renderer = MarkdownRenderer(code_block)
+    return renderer.feed(text) + renderer.finish()
+
+
+def fenced_code_blocks(text: str) -> list:
+    """``(language, code)`` for each fenced block, found by the same rules the renderer uses."""
+    blocks = []
+    fence = None
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+    for line in lines:
+        line = line.rstrip("\r")
+        if fence is None:
+            match = FENCE.match(line)
+            if match:
+                fence = (len(match.group(1)), match.group(2), match.group(3) or None, [])
+        elif closes_fence(line, fence[1]):
+            blocks.append((fence[2], "".join(line + "\n" for line in fence[3])))
+            fence = None
+        else:
+            fence[3].append(line[min(fence[0], len(line) - len(line.lstrip())):])
+    if fence is not None:
+        blocks.append((fence[2], "".join(line + "\n" for line in fence[3])))
+    return blocks
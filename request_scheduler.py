@@ -0,0 +1,364 @@
+"""
+Request scheduler between the app and the Groq client.
+
+Tracks each model's request and token allowance from the ``x-ratelimit-*`` headers Groq
+sends with every response, and waits when a model is out of allowance instead of
+collecting 429s. Rate limits and transient failures are retried with jittered backoff,
+and identical requests already in flight share a single call. Non-streaming requests
+can also be hedged: if a reply takes longer than the model's recent p95 latency, a
+second copy is sent and whichever answers first wins. Given a ``Telemetry``, every call
+is recorded with its queue wait, time to first token, latency and token counts.
+
+Everything here runs on one asyncio loop; failures are raised, never returned as text.
+"""
+import asyncio
+import random
+import re
+import time
+from collections import deque
+
+from context_window import estimate_tokens
+from response_cache import make_key
+
+DURATION_PART = re.compile(r"([\d.]+)(ms|h|m|s)")
+DURATION_SCALE = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+
+
+def parse_duration(value):
+    """Seconds from a header value such as ``"7.66s"``, ``"2m59.56s"``, ``"120ms"`` or ``"30"``."""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(number) * DURATION_SCALE[unit] for number, unit in parts)
+
+
+def retry_delay(error, attempt: int, base: float, cap: float = 30.0) -> float:
+    """Exponential backoff with full jitter, honouring a server-provided Retry-After."""
+    response = getattr(error, "response", None)
+    if response is not None:
+        retry_after = parse_duration(response.headers.get("retry-after"))
+        if retry_after is not None:
+            return min(retry_after, cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def transient_errors() -> tuple:
+    import groq
+
+    return groq.RateLimitError, groq.APIConnectionError, groq.InternalServerError
+
+
+class ModelBudget:
+    """Remaining requests and tokens for one model, as last reported by the API and spent locally since."""
+
+    def __init__(self):
+        self.remaining_requests = None
+        self.remaining_tokens = None
+        self.requests_reset_at = 0.0
+        self.tokens_reset_at = 0.0
+        self.blocked_until = 0.0
+
+    def update(self, headers, now=None):
+        now = time.monotonic() if now is None else now
+        requests = _header_number(headers, "x-ratelimit-remaining-requests")
+        if requests is not None:
+            self.remaining_requests = requests
+            self.requests_reset_at = now + (parse_duration(headers.get("x-ratelimit-reset-requests")) or 0.0)
+        tokens = _header_number(headers, "x-ratelimit-remaining-tokens")
+        if tokens is not None:
+            self.remaining_tokens = tokens
+            self.tokens_reset_at = now + (parse_duration(headers.get("x-ratelimit-reset-tokens")) or 0.0)
+        retry_after = parse_duration(headers.get("retry-after"))
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def wait_time(self, tokens: int, now=None) -> float:
+        """Seconds to wait before a request of about ``tokens`` tokens fits the budget."""
+        now = time.monotonic() if now is None else now
+        waits = [self.blocked_until - now]
+        if self.remaining_requests is not None and self.remaining_requests <= 0:
+            waits.append(self.requests_reset_at - now)
+        if self.remaining_tokens is not None and self.remaining_tokens < tokens:
+            waits.append(self.tokens_reset_at - now)
+        return max(0.0, *waits)
+
+    def reserve(self, tokens: int, now=None):
+        now = time.monotonic() if now is None else now
+        if self.remaining_requests is not None:
+            self.remaining_requests = None if now >= self.requests_reset_at else self.remaining_requests - 1
+        if self.remaining_tokens is not None:
+            self.remaining_tokens = None if now >= self.tokens_reset_at else self.remaining_tokens - tokens
+
+
+def _header_number(headers, name):
+    try:
+        return int(float(headers[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class _Subscriber:
+    __slots__ = ("on_chunk", "cancel", "parts", "done")
+
+    def __init__(self, on_chunk, cancel, done):
+        self.on_chunk = on_chunk
+        self.cancel = cancel
+        self.parts = []
+        self.done = done
+
+
+class _SharedRequest:
+    """One call to the API and every caller waiting on it."""
+
+    def __init__(self):
+        self.subscribers = []
+        self.parts = []
+        self.usage = {}
+        self.attempts = 0
+        self.dispatched_at = None
+        self.first_token_at = None
+        self.task = None
+
+
+class RequestScheduler:
+    def __init__(self, get_client, retries: int = 3, backoff: float = 0.5, max_backoff: float = 30.0,
+                 hedge: bool = False, hedge_percentile: float = 0.95, hedge_min_samples: int = 20, limiter=None,
+                 telemetry=None, cancel_poll: float = 0.05):
+        self.get_client = get_client
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.limiter = limiter
+        self.telemetry = telemetry
+        self.cancel_poll = cancel_poll
+        self.budgets = {}
+        self.latencies = {}
+        self.inflight = {}
+        self.deduplicated = 0
+        self.retried = 0
+        self.hedged = 0
+
+    def budget(self, model) -> ModelBudget:
+        return self.budgets.setdefault(model, ModelBudget())
+
+    def hedge_threshold(self, model):
+        samples = self.latencies.get(model)
+        if not samples or len(samples) < self.hedge_min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(self.hedge_percentile * (len(ordered) - 1))]
+
+    async def request(self, model, messages, params=None, stream=False, on_chunk=None, usage=None,
+                      cancel=None, stats=None) -> str:
+        """
+        Send a chat completion and return the reply text.
+
+        ``on_chunk`` receives streamed deltas, and ``usage`` is filled with token counts.
+        ``cancel`` is a ``threading.Event``: once set, the call returns the text received so far.
+        ``stats`` gets the number of attempts made and whether the call was shared.
+        """
+        started = time.monotonic()
+        params = params or {}
+        key = (stream, make_key(model, messages, params))
+        shared = self.inflight.get(key)
+        joined = shared is not None
+        if joined:
+            self.deduplicated += 1
+        else:
+            shared = self.inflight[key] = _SharedRequest()
+            shared.task = asyncio.ensure_future(self._run(key, shared, model, messages, params, stream))
+        subscriber = _Subscriber(on_chunk, cancel, asyncio.get_running_loop().create_future())
+        if shared.parts:
+            subscriber.parts.append("".join(shared.parts))
+            if on_chunk is not None:
+                on_chunk(subscriber.parts[0])
+        shared.subscribers.append(subscriber)
+        try:
+            text = await self._wait_for_result(shared, subscriber)
+        except asyncio.CancelledError:
+            self._detach(shared, subscriber)
+            self._record(model, stream, shared, started, "cancelled", joined)
+            raise
+        except Exception:
+            self._record(model, stream, shared, started, "error", joined)
+            raise
+        status = "cancelled" if cancel is not None and cancel.is_set() else "ok"
+        self._record(model, stream, shared, started, status, joined)
+        if usage is not None:
+            usage.update(shared.usage)
+        if stats is not None:
+            stats.update(attempts=shared.attempts, shared=joined)
+        return text
+
+    def _record(self, model, stream, shared, started, status, joined):
+        if self.telemetry is None:
+            return
+        now = time.monotonic()
+        dispatched = max(shared.dispatched_at or now, started)
+        first_token = max(shared.first_token_at, started) if shared.first_token_at is not None else None
+        completion_tokens = shared.usage.get("completion_tokens")
+        generating = now - first_token if stream and first_token is not None else now - dispatched
+        self.telemetry.record({
+            "started": time.time() - (now - started),
+            "model": model,
+            "stream": stream,
+            "status": status,
+            "shared": joined,
+            "attempts": shared.attempts,
+            "queue_wait": dispatched - started,
+            "ttft": first_token - started if first_token is not None else None,
+            "latency": now - started,
+            "prompt_tokens": shared.usage.get("prompt_tokens"),
+            "completion_tokens": completion_tokens,
+            "tokens_per_sec": completion_tokens / generating if completion_tokens and generating > 0 else None,
+        })
+
+    def _detach(self, shared, subscriber):
+        if subscriber in shared.subscribers:
+            shared.subscribers.remove(subscriber)
+        if not shared.subscribers and not shared.task.done():
+            shared.task.cancel()
+
+    async def _wait_for_result(self, shared, subscriber):
+        """The reply, or the text so far as soon as the caller's ``cancel`` is set, even before a response."""
+        if subscriber.cancel is None:
+            return await subscriber.done
+        while True:
+            done, _ = await asyncio.wait({subscriber.done}, timeout=self.cancel_poll)
+            if done:
+                return subscriber.done.result()
+            if subscriber.cancel.is_set():
+                self._detach(shared, subscriber)
+                return "".join(subscriber.parts)
+
+    def _drop_cancelled(self, shared):
+        for subscriber in list(shared.subscribers):
+            if subscriber.cancel is not None and subscriber.cancel.is_set():
+                shared.subscribers.remove(subscriber)
+                if not subscriber.done.done():
+                    subscriber.done.set_result("".join(subscriber.parts))
+        if not shared.subscribers:
+            raise asyncio.CancelledError()
+
+    async def _run(self, key, shared, model, messages, params, stream):
+        try:
+            if stream:
+                await self._with_retries(shared, model, messages, params, self._stream_once)
+            else:
+                text = await self._with_retries(shared, model, messages, params, self._complete_once)
+        except Exception as e:
+            for subscriber in shared.subscribers:
+                if not subscriber.done.done():
+                    subscriber.done.set_exception(e)
+        else:
+            for subscriber in shared.subscribers:
+                if not subscriber.done.done():
+                    subscriber.done.set_result("".join(subscriber.parts) if stream else text)
+        finally:
+            if self.inflight.get(key) is shared:
+                del self.inflight[key]
+            for subscriber in shared.subscribers:
+                if not subscriber.done.done():
+                    subscriber.done.cancel()
+
+    async def _with_retries(self, shared, model, messages, params, call):
+        budget = self.budget(model)
+        tokens = sum(estimate_tokens(message["content"]) for message in messages) + params.get("max_tokens", 0)
+        transient = transient_errors()
+        for attempt in range(self.retries + 1):
+            await self._wait_for_budget(shared, budget, tokens)
+            shared.attempts += 1
+            try:
+                return await call(shared, model, messages, params, tokens)
+            except transient as e:
+                response = getattr(e, "response", None)
+                if response is not None:
+                    budget.update(response.headers)
+                # A stream that already produced text can't be replayed without duplicating it.
+                if attempt == self.retries or shared.parts:
+                    raise
+                self.retried += 1
+                await asyncio.sleep(retry_delay(e, attempt, self.backoff, self.max_backoff))
+
+    async def _wait_for_budget(self, shared, budget, tokens):
+        while True:
+            self._drop_cancelled(shared)
+            delay = budget.wait_time(tokens)
+            if delay <= 0:
+                break
+            await asyncio.sleep(min(delay, 0.5))
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        budget.reserve(tokens)
+        shared.dispatched_at = time.monotonic()
+
+    async def _send(self, model, messages, params):
+        raw = await self.get_client().chat.completions.with_raw_response.create(
+            model=model, messages=messages, **params)
+        self.budget(model).update(raw.headers)
+        return await raw.parse()
+
+    async def _complete_once(self, shared, model, messages, params, tokens):
+        started = time.monotonic()
+        threshold = self.hedge_threshold(model) if self.hedge else None
+        if threshold is None:
+            response = await self._send(model, messages, params)
+        else:
+            response = await self._hedged(model, messages, params, tokens, threshold)
+        shared.first_token_at = time.monotonic()
+        self.latencies.setdefault(model, deque(maxlen=200)).append(shared.first_token_at - started)
+        if response.usage:
+            shared.usage.update(
+                prompt_tokens=response.usage.prompt_tokens, completion_tokens=response.usage.completion_tokens)
+        return response.choices[0].message.content
+
+    async def _hedged(self, model, messages, params, tokens, threshold):
+        first = asyncio.ensure_future(self._send(model, messages, params))
+        tasks = {first}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=threshold)
+            if not done and self.budget(model).wait_time(tokens) <= 0:
+                self.hedged += 1
+                self.budget(model).reserve(tokens)
+                tasks.add(asyncio.ensure_future(self._send(model, messages, params)))
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+            return first.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _stream_once(self, shared, model, messages, params, tokens):
+        response = await self._send(model, messages, {**params, "stream": True})
+        try:
+            async for chunk in response:
+                self._drop_cancelled(shared)
+                x_groq = getattr(chunk, "x_groq", None)
+                if x_groq is not None and x_groq.usage:
+                    shared.usage.update(
+                        prompt_tokens=x_groq.usage.prompt_tokens, completion_tokens=x_groq.usage.completion_tokens)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if shared.first_token_at is None:
+                        shared.first_token_at = time.monotonic()
+                    shared.parts.append(delta)
+                    for subscriber in shared.subscribers:
+                        subscriber.parts.append(delta)
+                        if subscriber.on_chunk is not None:
+                            subscriber.on_chunk(delta)
+        finally:
+            await response.close()
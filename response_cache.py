@@ -0,0 +1,129 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def normalize_messages(messages: list) -> list:
+    # Whitespace inside a message can matter (indentation in code), so only the ends and line endings are normalized.
+    return [{"role": m["role"], "content": m["content"].replace("\r\n", "\n").replace("\r", "\n").strip()}
+            for m in messages]
+
+
+def make_key(model: str, messages: list, params: dict = None) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": normalize_messages(messages), "params": params or {}},
+        sort_keys=True, ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of completions: an in-memory LRU in front of a SQLite table.
+
+    Entries older than ``ttl_seconds`` are ignored and pruned, and the disk tier is
+    trimmed to ``max_disk_bytes`` by dropping the least recently used rows.
+    """
+
+    def __init__(self, path="response_cache.sqlite3", max_memory_entries=256,
+                 max_disk_bytes=50 * 1024 * 1024, ttl_seconds=7 * 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.puts_since_prune = 0
+        self.lock = threading.Lock()
+        try:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+            self.db.commit()
+            self.prune()
+        except sqlite3.Error:
+            self.db = None
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def get(self, key: str):
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created <= self.ttl_seconds:
+                    self.memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self.memory[key]
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT value, created FROM responses WHERE key = ? AND created >= ?",
+                    (key, now - self.ttl_seconds)
+                ).fetchone()
+                if row is not None:
+                    self.db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                    self.db.commit()
+                    self._remember(key, row[0], row[1])
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str):
+        now = time.time()
+        with self.lock:
+            self._remember(key, value, now)
+            if self.db is None:
+                return
+            self.db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now)
+            )
+            self.db.commit()
+            self.puts_since_prune += 1
+            if self.puts_since_prune >= 50:
+                self._prune_locked()
+
+    def prune(self):
+        with self.lock:
+            self._prune_locked()
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM responses")
+                self.db.commit()
+
+    def _remember(self, key, value, created):
+        self.memory[key] = (value, created)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_memory_entries:
+            self.memory.popitem(last=False)
+
+    def _prune_locked(self):
+        self.puts_since_prune = 0
+        if self.db is None:
+            return
+        self.db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl_seconds,))
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > self.max_disk_bytes:
+            excess = total - self.max_disk_bytes
+            for key, size in self.db.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+                if excess <= 0:
+                    break
+                self.db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                excess -= size
+        self.db.commit()
@@ -0,0 +1,157 @@
+"""
+Latency-based model routing and multi-model racing.
+
+``LatencyRouter`` keeps a short rolling history of measured time to first token and
+generation speed per model, fed by ``Telemetry``. From that and the prompt length it
+estimates how long each model would take and picks the quickest whose context window
+fits the prompt. ``race`` sends one prompt to several models at once and keeps
+whichever answers first, cancelling the rest.
+"""
+import asyncio
+import statistics
+import threading
+import time
+from collections import deque
+
+from chat_models import context_size
+
+FASTEST = "fastest"
+AUTO = "auto"
+ROUTING_MODES = {
+    "🏁 Fastest (race models)": FASTEST,
+    "🧭 Auto (route by latency)": AUTO,
+}
+# Models that don't give general chat answers are never routed to.
+NOT_ROUTABLE = {"llama-guard-3-8b"}
+# Prompt tokens' worth of fixed per-request overhead when scaling time to first token.
+PREFILL_OVERHEAD_TOKENS = 500
+DEFAULT_REPLY_TOKENS = 300
+
+
+class LatencyRouter:
+    def __init__(self, models, history: int = 20, explore_every: int = 10, reserve_for_reply: int = 1024):
+        self.models = [model for model in models if model not in NOT_ROUTABLE]
+        self.history = {model: deque(maxlen=history) for model in self.models}
+        self.reply_tokens = deque(maxlen=history)
+        self.explore_every = explore_every
+        self.reserve_for_reply = reserve_for_reply
+        self.choices = 0
+        self.lock = threading.Lock()
+
+    def observe(self, sample: dict):
+        """Telemetry listener: learn from successful, unshared calls."""
+        if sample["status"] != "ok" or sample["shared"] or sample["ttft"] is None:
+            return
+        history = self.history.get(sample["model"])
+        if history is None:
+            return
+        with self.lock:
+            history.append((time.monotonic(), sample["prompt_tokens"] or 0, sample["ttft"], sample["tokens_per_sec"]))
+            if sample["completion_tokens"]:
+                self.reply_tokens.append(sample["completion_tokens"])
+
+    def fits(self, model, prompt_tokens: int) -> bool:
+        return prompt_tokens + self.reserve_for_reply <= context_size(model)
+
+    def estimate(self, model, prompt_tokens: int):
+        """Expected seconds for a full reply, or None if the model hasn't been measured yet."""
+        with self.lock:
+            samples = list(self.history[model])
+            reply_tokens = statistics.median(self.reply_tokens) if self.reply_tokens else DEFAULT_REPLY_TOKENS
+        if not samples:
+            return None
+        ttft = statistics.median(
+            measured * (prompt_tokens + PREFILL_OVERHEAD_TOKENS) / (measured_prompt + PREFILL_OVERHEAD_TOKENS)
+            for _, measured_prompt, measured, _ in samples)
+        speeds = [speed for *_, speed in samples if speed]
+        return ttft + (reply_tokens / statistics.median(speeds) if speeds else 0.0)
+
+    def ranked(self, prompt_tokens: int) -> list:
+        """
+        Models whose context fits the prompt, quickest first, then those not measured yet.
+
+        Race losers are cancelled before they finish and so never get measured; ranking
+        unmeasured models last keeps them from being preferred over the winner. ``choose``
+        still tries them on its exploration schedule.
+        """
+        eligible = [model for model in self.models if self.fits(model, prompt_tokens)]
+        if not eligible:
+            return [max(self.models, key=context_size)]
+        estimates = {model: self.estimate(model, prompt_tokens) for model in eligible}
+        return sorted(eligible, key=lambda model: (estimates[model] is None, estimates[model] or 0.0))
+
+    def choose(self, prompt_tokens: int) -> str:
+        ranked = self.ranked(prompt_tokens)
+        self.choices += 1
+        if self.explore_every and self.choices % self.explore_every == 0 and len(ranked) > 1:
+            # Now and then re-measure the model with the stalest history so estimates don't go stale.
+            with self.lock:
+                return min(ranked, key=lambda model: self.history[model][-1][0] if self.history[model] else 0.0)
+        return ranked[0]
+
+    def race_candidates(self, prompt_tokens: int, count: int = 3) -> list:
+        return self.ranked(prompt_tokens)[:max(count, 2)]
+
+
+class _EitherEvent:
+    """Looks like a ``threading.Event`` that is set once either event is."""
+
+    def __init__(self, first, second):
+        self.first = first
+        self.second = second
+
+    def is_set(self) -> bool:
+        return self.first.is_set() or (self.second is not None and self.second.is_set())
+
+
+async def race(scheduler, models, messages, params=None, stream=False, on_chunk=None, usage=None, cancel=None):
+    """
+    Send the same request to every model at once and return ``(text, model)`` for the winner.
+
+    Non-streamed, the first complete answer wins; streamed, the first model to produce a
+    token wins and only its chunks reach ``on_chunk``. The other requests are cancelled.
+    """
+    losers = {model: threading.Event() for model in models}
+    usages = {model: {} for model in models}
+    winner = None
+
+    def chunk_for(model):
+        def on_model_chunk(delta):
+            nonlocal winner
+            if winner is None:
+                winner = model
+                for other, event in losers.items():
+                    if other != model:
+                        event.set()
+            if winner == model and on_chunk is not None:
+                on_chunk(delta)
+        return on_model_chunk
+
+    tasks = {
+        asyncio.ensure_future(scheduler.request(
+            model, messages, params, stream=stream, on_chunk=chunk_for(model) if stream else None,
+            usage=usages[model], cancel=_EitherEvent(losers[model], cancel))): model
+        for model in models
+    }
+    pending = set(tasks)
+    errors = {}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                model = tasks[task]
+                if task.exception() is not None:
+                    errors[model] = task.exception()
+                elif not stream or model == winner:
+                    if usage is not None:
+                        usage.update(usages[model])
+                    return task.result(), model
+        if winner in errors:
+            raise errors[winner]
+        if errors:
+            raise next(iter(errors.values()))
+        # Every stream ended before producing a token, e.g. because the request was stopped.
+        return "", models[0]
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,104 @@
+import html
+import re
+from collections import defaultdict
+
+WORD_PATTERN = re.compile(r"\w+")
+QUERY_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+ROLE_ALIASES = {"user": "user", "you": "user", "assistant": "assistant", "ai": "assistant", "system": "system"}
+
+
+def tokenize(text: str) -> list:
+    return WORD_PATTERN.findall(text.lower())
+
+
+def parse_search_query(query: str):
+    """
+    Split a search box query into terms, quoted phrases and an optional role filter.
+
+    ``role:user "exact phrase" words`` -> (["words"], ["exact phrase"], "user")
+    """
+    terms, phrases, role = [], [], None
+    for phrase, word in QUERY_PATTERN.findall(query):
+        if phrase:
+            if tokenize(phrase):
+                phrases.append(" ".join(tokenize(phrase)))
+        elif word.lower().startswith("role:"):
+            role = ROLE_ALIASES.get(word[5:].lower(), role)
+        else:
+            terms.extend(tokenize(word))
+    return terms, phrases, role
+
+
+def fts_query(terms: list, phrases: list) -> str:
+    parts = [f'"{term}"' for term in terms]
+    parts += [f'"{phrase}"' for phrase in phrases]
+    return " AND ".join(parts)
+
+
+def highlight_excerpt(text: str, terms: list, phrases: list, width: int = 160) -> str:
+    """Return an HTML-escaped excerpt around the first hit with every hit in bold."""
+    needles = set(phrases) | set(terms)
+    for phrase in phrases:
+        needles.update(phrase.split())
+    needles = sorted(needles, key=len, reverse=True)
+    if not needles:
+        return html.escape(text[:width])
+    pattern = re.compile("|".join(re.escape(needle) for needle in needles), re.IGNORECASE)
+    first = pattern.search(text)
+    start = max((first.start() if first else 0) - width // 3, 0)
+    excerpt = text[start:start + width]
+    parts, last = [], 0
+    for match in pattern.finditer(excerpt):
+        parts.append(html.escape(excerpt[last:match.start()]))
+        parts.append(f"<b style='color: #FFD700;'>{html.escape(match.group())}</b>")
+        last = match.end()
+    parts.append(html.escape(excerpt[last:]))
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if start + width < len(text) else ""
+    return prefix + "".join(parts) + suffix
+
+
+class TokenIndex:
+    """In-process inverted index over the messages of the open chat, updated on append."""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+
+    def clear(self):
+        self.postings.clear()
+        self.documents.clear()
+
+    def add(self, key, role: str, text: str):
+        self.documents[key] = (role, text)
+        for token in tokenize(text):
+            counts = self.postings[token]
+            counts[key] = counts.get(key, 0) + 1
+
+    def search(self, terms: list, phrases: list, role=None, limit: int = 50) -> list:
+        tokens = list(terms)
+        for phrase in phrases:
+            tokens.extend(tokenize(phrase))
+        if not tokens:
+            return []
+        candidates = None
+        for token in sorted(set(tokens), key=lambda t: len(self.postings.get(t, ()))):
+            keys = self.postings.get(token)
+            if not keys:
+                return []
+            candidates = set(keys) if candidates is None else candidates & keys.keys()
+            if not candidates:
+                return []
+        hits = []
+        for key in candidates:
+            doc_role, text = self.documents[key]
+            if role and doc_role != role:
+                continue
+            if phrases:
+                normalized = f" {' '.join(tokenize(text))} "
+                if not all(f" {phrase} " in normalized for phrase in phrases):
+                    continue
+            score = sum(self.postings[token][key] for token in tokens)
+            hits.append((score, key))
+        hits.sort(key=lambda hit: (hit[0], hit[1]), reverse=True)
+        return [key for _, key in hits[:limit]]
@@ -0,0 +1,67 @@
+"""
+Sentiment scoring for chat messages.
+
+Scores come from TextBlob's pattern analyzer, created once and reused, and are cached
+by content hash so a message is scored at most once per run. Saved sessions keep their
+scores in the session store, and ``backfill`` scores whatever a session is missing in
+batches. Everything here is meant to run off the GUI thread.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class SentimentScorer:
+    def __init__(self, max_entries: int = 20000, batch_size: int = 500):
+        self.cache = OrderedDict()
+        self.max_entries = max_entries
+        self.batch_size = batch_size
+        self.analyzer = None
+        self.lock = threading.Lock()
+
+    def _analyze(self, text: str) -> tuple:
+        if self.analyzer is None:
+            from textblob.en.sentiments import PatternAnalyzer
+
+            self.analyzer = PatternAnalyzer()
+        sentiment = self.analyzer.analyze(text)
+        return round(sentiment.polarity, 4), round(sentiment.subjectivity, 4)
+
+    def score_batch(self, texts: list) -> list:
+        """``(polarity, subjectivity)`` for each text, scoring only those not seen before."""
+        keys = [hashlib.sha1(text.encode("utf-8")).digest() for text in texts]
+        results = [None] * len(texts)
+        with self.lock:
+            for i, key in enumerate(keys):
+                hit = self.cache.get(key)
+                if hit is not None:
+                    self.cache.move_to_end(key)
+                    results[i] = hit
+        fresh = {}
+        for i, result in enumerate(results):
+            if result is None:
+                results[i] = fresh[keys[i]] = self._analyze(texts[i])
+        if fresh:
+            with self.lock:
+                self.cache.update(fresh)
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last=False)
+        return results
+
+    def backfill(self, store, session_id: int) -> int:
+        """Score every message of a saved session that has no score yet. Returns how many were scored."""
+        total = 0
+        while True:
+            rows = store.unscored_messages(session_id, self.batch_size)
+            if not rows:
+                return total
+            scores = self.score_batch([content for _, content in rows])
+            store.set_sentiment([
+                (polarity, subjectivity, message_id)
+                for (message_id, _), (polarity, subjectivity) in zip(rows, scores)
+            ])
+            total += len(rows)
+
+
+def label(polarity: float) -> str:
+    return "Positive" if polarity > 0 else "Negative" if polarity < 0 else "Neutral"
@@ -0,0 +1,280 @@
+import queue
+import sqlite3
+import threading
+import time
+
+from search_index import fts_query
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    model TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    message_count INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(id),
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    model TEXT,
+    created REAL NOT NULL,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    polarity REAL,
+    subjectivity REAL
+);
+CREATE INDEX IF NOT EXISTS messages_session ON messages(session_id, id);
+"""
+
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE messages_fts USING fts5(content, content='messages', content_rowid='id');
+CREATE TRIGGER messages_fts_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+END;
+INSERT INTO messages_fts(messages_fts) VALUES ('rebuild');
+"""
+
+MESSAGE_KEYS = ("id", "session_id", "role", "content", "model", "created", "prompt_tokens", "completion_tokens",
+                "polarity", "subjectivity")
+MESSAGE_COLUMNS = ", ".join(MESSAGE_KEYS)
+
+
+def _message_row(row) -> dict:
+    return dict(zip(MESSAGE_KEYS, row))
+
+
+class SessionStore:
+    """
+    Append-only SQLite (WAL) store of chat sessions, one row per message.
+
+    Appends are queued and written in batches by a background thread at most
+    ``flush_interval`` seconds after they arrive, so the GUI thread never waits on disk.
+    """
+
+    def __init__(self, path="chat_sessions.sqlite3", flush_interval=0.5, max_batch=200):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.db = self.connect()
+        self.db.executescript(SCHEMA)
+        self.migrate()
+        self.db.commit()
+        self.fts_enabled = self.init_search()
+        self.lock = threading.Lock()
+        self.last_error = None
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, name="session-store-writer", daemon=True)
+        self.writer.start()
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def migrate(self):
+        """Add columns introduced after a database was created."""
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(messages)")}
+        for column in ("polarity", "subjectivity"):
+            if column not in columns:
+                self.db.execute(f"ALTER TABLE messages ADD COLUMN {column} REAL")
+
+    def init_search(self) -> bool:
+        """Create the FTS5 index (kept in sync by a trigger); fall back to LIKE scans without FTS5."""
+        exists = self.db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        if exists:
+            return True
+        try:
+            self.db.executescript(SEARCH_SCHEMA)
+            self.db.commit()
+            return True
+        except sqlite3.OperationalError:
+            self.db.rollback()
+            return False
+
+    def create_session(self, title: str, model: str = None) -> int:
+        now = time.time()
+        with self.lock:
+            cursor = self.db.execute(
+                "INSERT INTO sessions (title, model, created, updated) VALUES (?, ?, ?, ?)",
+                (title[:80] or "Untitled", model, now, now)
+            )
+            self.db.commit()
+            return cursor.lastrowid
+
+    def append(self, session_id: int, role: str, content: str, model: str = None, created: float = None,
+               prompt_tokens: int = None, completion_tokens: int = None, polarity: float = None,
+               subjectivity: float = None, on_saved=None):
+        """Queue a message; ``on_saved(message_id)`` is called from the writer thread once it is stored."""
+        self.pending.put(((session_id, role, content, model, created or time.time(), prompt_tokens,
+                           completion_tokens, polarity, subjectivity), on_saved))
+
+    def flush(self):
+        """Block until every queued message has been written."""
+        self.pending.join()
+
+    def close(self):
+        self.pending.put(None)
+        self.writer.join()
+        with self.lock:
+            self.db.close()
+
+    def list_sessions(self, limit: int = 100) -> list:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, title, model, created, updated, message_count FROM sessions "
+                "ORDER BY updated DESC LIMIT ?", (limit,)
+            ).fetchall()
+        keys = ("id", "title", "model", "created", "updated", "message_count")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def load_recent(self, session_id: int, limit: int = 50) -> list:
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+        return [_message_row(row) for row in reversed(rows)]
+
+    def load_before(self, session_id: int, before_id: int, limit: int = 50) -> list:
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (session_id, before_id, limit)
+            ).fetchall()
+        return [_message_row(row) for row in reversed(rows)]
+
+    def search(self, terms: list, phrases: list, role: str = None, exclude=(), limit: int = 50) -> list:
+        """
+        Rank persisted messages against the query, best first.
+
+        ``exclude`` holds ``(session_id, from_id)`` pairs for sessions open in the app; their
+        messages from ``from_id`` on are already in memory and are not reported twice.
+        """
+        if not terms and not phrases:
+            return []
+        sql = (
+            "SELECT m.id, m.session_id, m.role, m.content, m.created, s.title "
+            "FROM {source} JOIN sessions s ON s.id = m.session_id WHERE {match}"
+        )
+        if self.fts_enabled:
+            sql = sql.format(source="messages_fts JOIN messages m ON m.id = messages_fts.rowid",
+                             match="messages_fts MATCH ?")
+            params = [fts_query(terms, phrases)]
+        else:
+            needles = terms + phrases
+            sql = sql.format(source="messages m", match=" AND ".join("m.content LIKE ?" for _ in needles))
+            params = [f"%{needle}%" for needle in needles]
+        if role:
+            sql += " AND m.role = ?"
+            params.append(role)
+        for session_id, from_id in exclude:
+            sql += " AND NOT (m.session_id = ? AND m.id >= ?)"
+            params += [session_id, from_id]
+        sql += " ORDER BY bm25(messages_fts) LIMIT ?" if self.fts_enabled else " ORDER BY m.id DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.db.execute(sql, params).fetchall()
+        keys = ("id", "session_id", "role", "content", "created", "title")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def count_messages(self, session_id: int, before_id: int = None) -> int:
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM messages WHERE session_id = ? AND id < ?",
+                (session_id, before_id if before_id is not None else 2 ** 63 - 1)
+            ).fetchone()[0]
+
+    def unscored_messages(self, session_id: int, limit: int = 500) -> list:
+        """``(id, content)`` for messages of a session that have no sentiment score yet, oldest first."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT id, content FROM messages WHERE session_id = ? AND polarity IS NULL ORDER BY id LIMIT ?",
+                (session_id, limit)
+            ).fetchall()
+
+    def set_sentiment(self, rows: list):
+        """Store ``(polarity, subjectivity, message_id)`` rows in one transaction."""
+        with self.lock:
+            with self.db:
+                self.db.executemany("UPDATE messages SET polarity = ?, subjectivity = ? WHERE id = ?", rows)
+
+    def sentiment_series(self, session_id: int) -> list:
+        """``(role, created, polarity)`` for every message of a session, oldest first."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT role, created, polarity FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+
+    def iter_messages(self, session_id: int, batch_size: int = 500, before_id: int = None):
+        """Yield a session's messages oldest first without loading them all at once."""
+        db = self.connect()
+        end_id = before_id if before_id is not None else 2 ** 63 - 1
+        try:
+            last_id = 0
+            while True:
+                rows = db.execute(
+                    f"SELECT {MESSAGE_COLUMNS} FROM messages WHERE session_id = ? AND id > ? AND id < ? "
+                    "ORDER BY id LIMIT ?",
+                    (session_id, last_id, end_id, batch_size)
+                ).fetchall()
+                if not rows:
+                    return
+                for row in rows:
+                    yield _message_row(row)
+                last_id = rows[-1][0]
+        finally:
+            db.close()
+
+    def _write_loop(self):
+        db = self.connect()
+        running = True
+        while running:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if None in batch:
+                running = False
+                batch = [item for item in batch if item is not None]
+            try:
+                self._write_batch(db, batch)
+            except sqlite3.Error as e:
+                self.last_error = e
+            finally:
+                for _ in range(len(batch) + (0 if running else 1)):
+                    self.pending.task_done()
+        db.close()
+
+    def _write_batch(self, db, batch):
+        if not batch:
+            return
+        counts = {}
+        saved = []
+        with db:
+            for row, on_saved in batch:
+                cursor = db.execute(
+                    "INSERT INTO messages (session_id, role, content, model, created, prompt_tokens, "
+                    "completion_tokens, polarity, subjectivity) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row
+                )
+                counts[row[0]] = counts.get(row[0], 0) + 1
+                if on_saved is not None:
+                    saved.append((on_saved, cursor.lastrowid))
+            now = time.time()
+            db.executemany(
+                "UPDATE sessions SET updated = ?, message_count = message_count + ? WHERE id = ?",
+                [(now, count, session_id) for session_id, count in counts.items()]
+            )
+        for on_saved, message_id in saved:
+            on_saved(message_id)
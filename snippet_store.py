@@ -0,0 +1,271 @@
+"""
+Content-addressed store of code snippets seen in chats.
+
+Snippets are keyed by a hash of their code, so the same block pasted or repeated across
+messages and sessions is kept once and always gets the same id. Each snippet records
+its language (fenced or detected) and every message it came from, once per message. Recently used code is
+kept in memory up to ``max_memory_bytes``; beyond that the least recently used snippets
+are spilled to a SQLite file, which also lets them be browsed and searched in later runs.
+"""
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snippets (
+    id INTEGER PRIMARY KEY,
+    hash TEXT NOT NULL UNIQUE,
+    language TEXT,
+    code TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snippet_sources (
+    snippet_id INTEGER NOT NULL REFERENCES snippets(id),
+    session_id INTEGER,
+    message_id INTEGER,
+    title TEXT,
+    role TEXT,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snippet_sources_snippet ON snippet_sources(snippet_id);
+"""
+
+# Databases written before sources were unique may list a message more than once.
+UNIQUE_SOURCES = """
+DELETE FROM snippet_sources WHERE message_id IS NOT NULL AND rowid NOT IN (
+    SELECT MIN(rowid) FROM snippet_sources WHERE message_id IS NOT NULL GROUP BY snippet_id, session_id, message_id
+);
+CREATE UNIQUE INDEX snippet_sources_unique ON snippet_sources(snippet_id, session_id, message_id);
+"""
+SOURCE_KEYS = ("snippet_id", "session_id", "message_id", "title", "role", "created")
+
+SNIPPET_KEYS = ("id", "hash", "language", "code", "size", "created")
+
+
+def snippet_hash(code: str) -> str:
+    return hashlib.sha1(code.encode("utf-8")).hexdigest()
+
+
+class SnippetStore:
+    def __init__(self, path="snippets.sqlite3", max_memory_bytes=2 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.ids = {}
+        self.dirty = set()
+        self.pending_sources = []
+        self.unsaved = {}
+        self.lock = threading.Lock()
+        try:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.executescript(SCHEMA)
+            exists = self.db.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'snippet_sources_unique'"
+            ).fetchone()
+            if not exists:
+                self.db.executescript(UNIQUE_SOURCES)
+            self.db.commit()
+            self.next_id = self.db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM snippets").fetchone()[0]
+        except sqlite3.Error:
+            # Without a disk tier everything stays in memory.
+            self.db = None
+            self.next_id = 1
+
+    def add(self, code: str, language=None, session_id=None, message_id=None, title=None, role=None,
+            source_key=None) -> int:
+        """
+        Store ``code`` unless it is already known, note where it came from, and return its id.
+        A message that is not saved yet can pass a ``source_key``; its source waits for ``saved``.
+        """
+        key = snippet_hash(code)
+        now = time.time()
+        with self.lock:
+            snippet_id = self.ids.get(key)
+            if snippet_id is None and self.db is not None:
+                row = self.db.execute(f"SELECT {', '.join(SNIPPET_KEYS)} FROM snippets WHERE hash = ?",
+                                      (key,)).fetchone()
+                if row is not None:
+                    snippet_id = row[0]
+                    self._remember(dict(zip(SNIPPET_KEYS, row)))
+            if snippet_id is None:
+                snippet_id = self.next_id
+                self.next_id += 1
+                self._remember({"id": snippet_id, "hash": key, "language": language, "code": code,
+                                "size": len(code.encode("utf-8")), "created": now})
+                self.dirty.add(snippet_id)
+            else:
+                entry = self.memory[snippet_id]
+                self.memory.move_to_end(snippet_id)
+                if language and not entry["language"]:
+                    entry["language"] = language
+                    self.dirty.add(snippet_id)
+            source = (snippet_id, session_id, message_id, title, role, now)
+            if message_id is None and source_key is not None:
+                self.unsaved.setdefault(source_key, []).append(source)
+            else:
+                self._add_source_locked(source)
+            self._spill_locked()
+            return snippet_id
+
+    def saved(self, source_key, session_id: int, message_id: int, title=None):
+        """The message added under ``source_key`` was stored: record its sources with its ids."""
+        with self.lock:
+            for snippet_id, _, _, source_title, role, created in self.unsaved.pop(source_key, ()):
+                self._add_source_locked((snippet_id, session_id, message_id, title or source_title, role, created))
+            self._spill_locked()
+
+    def get(self, snippet_id: int):
+        """The snippet as a dict with ``id, hash, language, code, size, created``, or None."""
+        with self.lock:
+            entry = self.memory.get(snippet_id)
+            if entry is not None:
+                self.memory.move_to_end(snippet_id)
+                return dict(entry)
+            if self.db is None:
+                return None
+            row = self.db.execute(f"SELECT {', '.join(SNIPPET_KEYS)} FROM snippets WHERE id = ?",
+                                  (snippet_id,)).fetchone()
+            if row is None:
+                return None
+            entry = dict(zip(SNIPPET_KEYS, row))
+            self._remember(entry)
+            self._spill_locked()
+            return dict(entry)
+
+    def set_language(self, snippet_id: int, language: str):
+        with self.lock:
+            entry = self.memory.get(snippet_id)
+            if entry is not None:
+                entry["language"] = language
+                self.dirty.add(snippet_id)
+            elif self.db is not None:
+                self.db.execute("UPDATE snippets SET language = ? WHERE id = ?", (language, snippet_id))
+                self.db.commit()
+
+    def release(self, snippet_ids):
+        """Move snippets nobody is looking at out of memory."""
+        with self.lock:
+            if self.db is None:
+                return
+            ids = [snippet_id for snippet_id in snippet_ids if snippet_id in self.memory]
+            self._write_locked(ids)
+            for snippet_id in ids:
+                self._forget(snippet_id)
+
+    def search(self, text: str = "", language: str = None, limit: int = 200) -> list:
+        """
+        Newest first: snippet dicts whose code or language contains ``text``, each with
+        ``sources`` (how many messages it appeared in) and the ``title`` of the latest one.
+        """
+        with self.lock:
+            unsaved = {}
+            for sources in self.unsaved.values():
+                for source in sources:
+                    unsaved[source[0]] = unsaved.get(source[0], 0) + 1
+            if self.db is None:
+                entries = [dict(entry, sources=unsaved.get(entry["id"], 0), title=None) for entry in reversed(self.memory.values())
+                           if (not text or text.lower() in entry["code"].lower()
+                               or text.lower() in (entry["language"] or "").lower())
+                           and (language is None or entry["language"] == language)]
+                return entries[:limit]
+            self._write_locked(list(self.dirty))
+            pattern = "%" + text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            sql = (
+                f"SELECT {', '.join('s.' + key for key in SNIPPET_KEYS)}, COUNT(src.snippet_id), "
+                "(SELECT title FROM snippet_sources WHERE snippet_id = s.id AND title IS NOT NULL "
+                " ORDER BY created DESC LIMIT 1) "
+                "FROM snippets s LEFT JOIN snippet_sources src ON src.snippet_id = s.id "
+                "WHERE (s.code LIKE ? ESCAPE '\\' OR s.language LIKE ? ESCAPE '\\')"
+            )
+            args = [pattern, pattern]
+            if language is not None:
+                sql += " AND s.language = ?"
+                args.append(language)
+            sql += " GROUP BY s.id ORDER BY s.id DESC LIMIT ?"
+            args.append(limit)
+            rows = self.db.execute(sql, args).fetchall()
+        entries = [dict(zip(SNIPPET_KEYS + ("sources", "title"), row)) for row in rows]
+        for entry in entries:
+            entry["sources"] += unsaved.get(entry["id"], 0)
+        return entries
+
+    def sources(self, snippet_id: int) -> list:
+        """Where a snippet was seen: ``session_id, message_id, title, role, created`` dicts, newest first."""
+        with self.lock:
+            rows = [source for sources in self.unsaved.values() for source in sources if source[0] == snippet_id]
+            if self.db is None:
+                rows += [source for source in self.pending_sources if source[0] == snippet_id]
+            else:
+                self._write_locked([])
+                rows += self.db.execute(
+                    f"SELECT {', '.join(SOURCE_KEYS)} FROM snippet_sources WHERE snippet_id = ?", (snippet_id,)
+                ).fetchall()
+        return [dict(zip(SOURCE_KEYS, row)) for row in sorted(rows, key=lambda row: row[5], reverse=True)]
+
+    def flush(self):
+        with self.lock:
+            if self.db is not None:
+                self._write_locked(list(self.dirty))
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                # Sources of messages that were never saved are kept without message ids.
+                for sources in self.unsaved.values():
+                    self.pending_sources += sources
+                self.unsaved = {}
+                self._write_locked(list(self.dirty))
+                self.db.close()
+                self.db = None
+
+    def _remember(self, entry):
+        self.memory[entry["id"]] = entry
+        self.ids[entry["hash"]] = entry["id"]
+        self.memory_bytes += entry["size"]
+
+    def _forget(self, snippet_id):
+        entry = self.memory.pop(snippet_id)
+        del self.ids[entry["hash"]]
+        self.memory_bytes -= entry["size"]
+
+    def _add_source_locked(self, source):
+        if source[2] is not None and any(pending[:3] == source[:3] for pending in self.pending_sources):
+            return
+        self.pending_sources.append(source)
+
+    def _spill_locked(self):
+        if self.db is None:
+            return
+        if self.memory_bytes <= self.max_memory_bytes:
+            if len(self.pending_sources) >= 200:
+                self._write_locked([])
+            return
+        spilled = []
+        spilled_bytes = 0
+        for snippet_id, entry in self.memory.items():
+            if self.memory_bytes - spilled_bytes <= self.max_memory_bytes or len(self.memory) - len(spilled) <= 1:
+                break
+            spilled.append(snippet_id)
+            spilled_bytes += entry["size"]
+        self._write_locked(spilled)
+        for snippet_id in spilled:
+            self._forget(snippet_id)
+
+    def _write_locked(self, snippet_ids):
+        """Write the given snippets if they changed, plus every pending source, in one transaction."""
+        rows = [tuple(self.memory[snippet_id][key] for key in SNIPPET_KEYS)
+                for snippet_id in snippet_ids if snippet_id in self.dirty]
+        if not rows and not self.pending_sources:
+            return
+        self.db.executemany(
+            f"INSERT INTO snippets ({', '.join(SNIPPET_KEYS)}) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET language = excluded.language", rows)
+        self.db.executemany(
+            f"INSERT OR IGNORE INTO snippet_sources ({', '.join(SOURCE_KEYS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            self.pending_sources)
+        self.db.commit()
+        self.dirty.difference_update(snippet_ids)
+        self.pending_sources = []
@@ -0,0 +1,178 @@
+"""
+Text-to-speech on a dedicated thread.
+
+The speech engine is created and driven only from the worker thread, so the GUI never
+waits on it. Text is split into sentences as it arrives, which lets the first sentence
+of a streamed reply be spoken while the rest is still coming in.
+"""
+import queue
+import re
+import threading
+
+CODE_FENCE = "```"
+SENTENCE_END = re.compile(r"[.!?]+[\"')\]]*\s+|\n\s*\n")
+MARKDOWN_NOISE = re.compile(r"[*_`#>|]+")
+MAX_SENTENCE_CHARS = 300
+
+
+def default_engine():
+    import pyttsx3
+
+    return pyttsx3.init()
+
+
+def speakable(text: str) -> str:
+    return " ".join(MARKDOWN_NOISE.sub(" ", text).split())
+
+
+class SentenceSplitter:
+    """Turns a stream of text deltas into complete, speakable sentences. Code blocks are not read out."""
+
+    def __init__(self):
+        self.buffer = ""
+        self.in_code = False
+
+    def reset(self):
+        self.buffer = ""
+        self.in_code = False
+
+    def feed(self, delta: str):
+        self.buffer += delta
+        sentences = []
+        while self.buffer:
+            if self.in_code:
+                end = self.buffer.find(CODE_FENCE)
+                if end < 0:
+                    break
+                self.buffer = self.buffer[end + len(CODE_FENCE):]
+                self.in_code = False
+                sentences.append("Code snippet.")
+                continue
+            fence = self.buffer.find(CODE_FENCE)
+            prose = self.buffer if fence < 0 else self.buffer[:fence]
+            match = SENTENCE_END.search(prose)
+            if match:
+                sentences.append(self.buffer[:match.end()])
+                self.buffer = self.buffer[match.end():]
+            elif fence >= 0:
+                sentences.append(prose)
+                self.buffer = self.buffer[fence + len(CODE_FENCE):]
+                self.in_code = True
+            elif len(prose) > MAX_SENTENCE_CHARS:
+                # No punctuation in sight; break at a word so speech doesn't wait for the whole reply.
+                cut = prose.rfind(" ", 0, MAX_SENTENCE_CHARS) + 1 or MAX_SENTENCE_CHARS
+                sentences.append(prose[:cut])
+                self.buffer = self.buffer[cut:]
+            else:
+                break
+        return [s for s in map(speakable, sentences) if s]
+
+    def finish(self):
+        rest = "" if self.in_code else speakable(self.buffer)
+        self.reset()
+        return [rest] if rest else []
+
+
+class SpeechQueue:
+    """
+    Speaks queued sentences one at a time on a background thread.
+
+    ``stop`` drops everything queued and interrupts the current sentence, ``skip`` only
+    interrupts the current sentence, and ``pause`` interrupts it and repeats it on ``resume``.
+    ``on_error`` is called from the worker thread if the engine cannot be started or fails.
+    """
+
+    def __init__(self, engine_factory=default_engine, on_error=None):
+        self.engine_factory = engine_factory
+        self.on_error = on_error
+        self.engine = None
+        self.splitter = SentenceSplitter()
+        self.sentences = queue.Queue()
+        self.generation = 0
+        self.resumed = threading.Event()
+        self.resumed.set()
+        self.interrupt = threading.Event()
+        self.speaking = False
+        self.thread = threading.Thread(target=self._run, name="speech", daemon=True)
+        self.thread.start()
+
+    @property
+    def paused(self) -> bool:
+        return not self.resumed.is_set()
+
+    @property
+    def busy(self) -> bool:
+        return self.speaking or not self.sentences.empty()
+
+    def feed(self, delta: str):
+        """Queue every sentence completed by ``delta``; the remainder waits for more text."""
+        for sentence in self.splitter.feed(delta):
+            self.sentences.put((self.generation, sentence))
+
+    def finish(self):
+        """Queue whatever is left of the current text once it is complete."""
+        for sentence in self.splitter.finish():
+            self.sentences.put((self.generation, sentence))
+
+    def speak(self, text: str):
+        self.feed(text)
+        self.finish()
+
+    def stop(self):
+        self.generation += 1
+        self.splitter.reset()
+        self.interrupt.set()
+        self.resumed.set()
+
+    def skip(self):
+        self.interrupt.set()
+
+    def pause(self):
+        self.resumed.clear()
+        self.interrupt.set()
+
+    def resume(self):
+        self.resumed.set()
+
+    def close(self):
+        self.stop()
+        self.sentences.put(None)
+        self.thread.join(timeout=2.0)
+
+    def _run(self):
+        while True:
+            item = self.sentences.get()
+            if item is None:
+                return
+            generation, sentence = item
+            while generation == self.generation:
+                self.resumed.wait()
+                if generation != self.generation:
+                    break
+                self.interrupt.clear()
+                if not self._say(sentence):
+                    break
+                # A pause interrupts the sentence; say it again from the start once resumed.
+                if self.resumed.is_set():
+                    break
+
+    def _say(self, sentence: str) -> bool:
+        try:
+            if self.engine is None:
+                self.engine = self.engine_factory()
+                self.engine.connect("started-word", self._check_interrupt)
+            self.speaking = True
+            self.engine.say(sentence)
+            self.engine.runAndWait()
+            return True
+        except Exception as e:
+            self.generation += 1
+            if self.on_error is not None:
+                self.on_error(e)
+            return False
+        finally:
+            self.speaking = False
+
+    def _check_interrupt(self, name, location, length):
+        if self.interrupt.is_set():
+            self.engine.stop()
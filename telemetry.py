@@ -0,0 +1,121 @@
+"""
+Per-request performance telemetry.
+
+``RequestScheduler`` records one sample per call: model, queue wait, time to first token,
+total latency, token counts and generation speed. Recording only appends to a bounded
+deque and bumps a few counters; percentiles are computed when someone looks at them.
+Samples can be exported as JSONL, and rolling summaries plus cumulative counters as
+Prometheus text (suitable for node_exporter's textfile collector).
+"""
+import json
+import os
+import threading
+from collections import deque
+
+TIMINGS = ("queue_wait", "ttft", "latency", "tokens_per_sec")
+QUANTILES = (0.5, 0.95)
+PROMETHEUS_METRICS = {
+    "queue_wait": ("groq_ai_request_queue_wait_seconds", "Time spent waiting for rate limits, retries and backoff."),
+    "ttft": ("groq_ai_request_time_to_first_token_seconds", "Time from a request being made to its first token."),
+    "latency": ("groq_ai_request_latency_seconds", "Time from a request being made to its last token."),
+    "tokens_per_sec": ("groq_ai_completion_tokens_per_second", "Completion tokens generated per second."),
+}
+
+
+def percentile(ordered: list, q: float):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Telemetry:
+    """Rolling window of request samples per model, plus counters since startup."""
+
+    def __init__(self, window: int = 500):
+        self.window = window
+        self.samples = {}
+        self.requests = {}
+        self.tokens = {}
+        self.listeners = []
+        self.lock = threading.Lock()
+
+    def record(self, sample: dict):
+        model = sample["model"]
+        with self.lock:
+            samples = self.samples.get(model)
+            if samples is None:
+                samples = self.samples[model] = deque(maxlen=self.window)
+            samples.append(sample)
+            key = (model, sample["status"])
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for kind in ("prompt", "completion"):
+                self.tokens[(model, kind)] = self.tokens.get((model, kind), 0) + (sample[f"{kind}_tokens"] or 0)
+        for listener in self.listeners:
+            listener(sample)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+            self.requests.clear()
+            self.tokens.clear()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {model: list(samples) for model, samples in self.samples.items()}
+
+    def summary(self) -> dict:
+        """``{model: {"count", "errors", timing: {"p50", "p95", "sum", "count"}}}`` over the rolling window."""
+        result = {}
+        for model, samples in self.snapshot().items():
+            ok = [s for s in samples if s["status"] == "ok"]
+            stats = {"count": len(samples), "errors": sum(s["status"] == "error" for s in samples)}
+            for name in TIMINGS:
+                values = sorted(s[name] for s in ok if s[name] is not None)
+                stats[name] = {
+                    "p50": percentile(values, 0.5), "p95": percentile(values, 0.95),
+                    "sum": sum(values), "count": len(values)
+                }
+            result[model] = stats
+        return result
+
+    def prometheus_text(self) -> str:
+        summary = self.summary()
+        lines = []
+        for name in TIMINGS:
+            metric, help_text = PROMETHEUS_METRICS[name]
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+            for model, stats in summary.items():
+                timing = stats[name]
+                model_label = f'model="{_label(model)}"'
+                for q in QUANTILES:
+                    value = timing["p50" if q == 0.5 else "p95"]
+                    if value is not None:
+                        lines.append(f'{metric}{{{model_label},quantile="{q}"}} {value:.6g}')
+                lines.append(f"{metric}_sum{{{model_label}}} {timing['sum']:.6g}")
+                lines.append(f"{metric}_count{{{model_label}}} {timing['count']}")
+        with self.lock:
+            requests = sorted(self.requests.items())
+            tokens = sorted(self.tokens.items())
+        lines += ["# HELP groq_ai_requests_total Requests made, by outcome.", "# TYPE groq_ai_requests_total counter"]
+        lines += [f'groq_ai_requests_total{{model="{_label(model)}",status="{status}"}} {count}'
+                  for (model, status), count in requests]
+        lines += ["# HELP groq_ai_tokens_total Tokens used, by kind.", "# TYPE groq_ai_tokens_total counter"]
+        lines += [f'groq_ai_tokens_total{{model="{_label(model)}",kind="{kind}"}} {count}'
+                  for (model, kind), count in tokens]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Write Prometheus text, or every sample in the window as JSONL if ``path`` ends in ``.jsonl``."""
+        if path.endswith(".jsonl"):
+            samples = sorted((s for model in self.snapshot().values() for s in model), key=lambda s: s["started"])
+            text = "".join(json.dumps(sample) + "\n" for sample in samples)
+        else:
+            text = self.prometheus_text()
+        temp = path + ".part"
+        with open(temp, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(temp, path)